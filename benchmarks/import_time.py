@@ -0,0 +1,45 @@
+# Import-time benchmark
+# ==================================================
+import sys
+import os
+import subprocess
+import numpy as np
+# ==================================================
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    'import qtool'              : 'import qtool',
+    'qtool.math.gradient'       : 'import qtool; qtool.math.gradient',
+    'qtool.thermo.thermo'       : 'from qtool.thermo import thermo',
+    'qtool.math.Polynomial'     : 'import qtool; qtool.math.Polynomial',
+    'qtool.math.Piecewise_Func' : 'import qtool; qtool.math.Piecewise_Func',
+    'Piecewise_Func("x^2")'     : 'import qtool; qtool.math.Piecewise_Func([("x^2", "x < 1")])',
+}
+
+def time_import(stmt, repeat=5):
+    """wall time [ms] of `stmt` in a fresh interpreter, one sample per run"""
+    code = ('from time import perf_counter; t0 = perf_counter(); '
+            f'{stmt}; print((perf_counter() - t0) * 1e3)')
+    res = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        res.append(float(out.stdout.strip().splitlines()[-1]))
+    return np.array(res)
+
+# ==================================================
+
+def main():
+    print(f"{'case':<28s}{'median':>10s}{'min':>10s}  [ms]")
+    for name, stmt in CASES.items():
+        t = time_import(stmt)
+        print(f"{name:<28s}{np.median(t):>10.1f}{t.min():>10.1f}")
+
+# ==================================================
+from time import perf_counter
+if __name__ == '__main__':
+    start_time = perf_counter()
+    main()
+    end_time = perf_counter()
+    print('\ntime :%.3f ms' %((end_time - start_time)*1000))
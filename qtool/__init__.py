@@ -10,12 +10,22 @@ Submodules:
     2. nctools
     3. thermo
 
+Submodules are imported lazily on first attribute access, so `import qtool`
+itself does not pull in numpy, sympy or matplotlib.
 
 author: Quark, NTUAS
 """
 import sys
 sys.path.append(__file__[:-12])
 
-from . import math
-# from . import nctools
-from . import thermo
\ No newline at end of file
+import importlib
+
+_submodules = ['math', 'thermo'] # 'nctools'
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + _submodules)
@@ -9,15 +9,57 @@ Provides:
 
 Submodules:
     base         : numerical methods for mathematical calculations
+    chunked      : out-of-core vector calculus over memory-mapped arrays
     de           : tools for differential equations
+    elliptic     : Poisson / Helmholtz solvers, streamfunction and velocity potential
+    expr         : cache of LaTeX -> numpy functions
     polynomial   : tools for polynomial calculations
+    quadrature   : adaptive Gauss-Kronrod quadrature, batched over many intervals
     vector       : tools for vector calculations
+    numerical    : finite difference and vector calculus on arrays
+    spectral     : FFT derivatives for periodic domains
+    stencil      : finite difference weights of any order on uniform and non-uniform grids
+
+Names are resolved lazily: `qtool.math.gradient` only imports `numerical`,
+and heavy dependencies (sympy, latex2sympy2, matplotlib) are imported inside
+the functions that need them.
 """
 import sys
 sys.path.append(__file__[:-12])
 
-from .base       import *
-from .de         import *
-from .polynomial import *
-from .vector     import *
-from .numerical  import *
\ No newline at end of file
+import importlib
+
+# public name -> submodule, keep in sync with `__all__` of each submodule
+_submodule_attrs = {
+    'base'      : ['Piecewise_Func'],
+    'chunked'   : ['chunked_gradient', 'chunked_divergence', 'chunked_curl'],
+    'expr'      : ['ExprCache', 'expr_cache', 'latex_to_sympy', 'lambdify_latex', 
+                   'set_expr_cache_dir', 'expr_cache_info'],
+    'de'        : ['ODE', 'ODE_System', 'ODE_Solver'],
+    'elliptic'  : ['poisson_fft', 'poisson_mg', 'streamfunction', 'velocity_potential'],
+    'polynomial': ['horner', 'clenshaw', 'pt_to_poly', 'poly_fit', 'Polynomial', 'PolynomialBatch'],
+    'quadrature': ['quad', 'quad_batch'],
+    'vector'    : ['Vector', 'dot', 'cross', 'angle'],
+    'spectral'  : ['wavenumbers', 'spectral_gradient', 'spectral_divergence', 'spectral_curl', 
+                   'spectral_laplacian'],
+    'stencil'   : ['fd_weights', 'Stencil', 'get_stencil', 'derivative'],
+    'numerical' : ['integrate', 'cumulative_integrate', 'fdd_3pt_forward', 'fdd_3pt_backward', 'fdd_2pt_central',
+                   'StreamingDerivative', 'DerivativeCache', 'gradient', 'divergence', 'curl', 
+                   'laplacian', 'vorticity', 'advection', 'deformation'],
+}
+_attr_to_submodule = {attr: mod for mod, attrs in _submodule_attrs.items() for attr in attrs}
+
+__all__ = list(_attr_to_submodule)
+
+def __getattr__(name):
+    if name in _submodule_attrs:
+        return importlib.import_module(f'.{name}', __name__)
+    if name in _attr_to_submodule:
+        module = importlib.import_module(f'.{_attr_to_submodule[name]}', __name__)
+        attr   = getattr(module, name)
+        globals()[name] = attr # cache, skip __getattr__ next time
+        return attr
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + list(_submodule_attrs) + __all__)
@@ -1,10 +1,12 @@
 # _summary_
 # ==================================================
+from bisect import bisect_left, bisect_right
+from heapq import heappush, heappop
+
 import numpy as np
-import sympy as sp
 from numpy import cos, sin
 
-from latex2sympy2 import latex2sympy
+from .expr import latex_to_sympy, lambdify_latex
 # ==================================================
 __all__ = ['Piecewise_Func']
 # ==================================================
@@ -16,6 +18,9 @@ class Piecewise_Func(object):
             tuple: (function, condition) \\
             function: int | float | str | 'function' \\
             condition: str | 'function'
+        mode (str): 
+            'sum': value is the sum of all pieces whose condition holds (default) \\
+            'first': value of the first piece whose condition holds (`np.select`)
             
     Example:
         ```python
@@ -24,20 +29,60 @@ class Piecewise_Func(object):
             ('x^2', lambda x: (x>=1) & (x<3)),
             (1, lambda x: (x>=3) & (x<5)),
         ])
+        # interval partition, dispatched by sorted breakpoints
+        g = Piecewise_Func.from_breakpoints([lambda x: 2*x, 'x^2', 1], [-np.inf, 1, 3, 5])
         ```
+    Note:
+        for arrays, each function is only evaluated on the points where its condition holds, \\
+        points without any piece are 0 \\
+        if all conditions are strings of intervals in x (e.g. 'x < 1', 'x \\geq 3'), or the function \\
+        is built by `from_breakpoints`, points are dispatched to their piece by `np.searchsorted` \\
+        on the sorted breakpoints instead of testing every condition
     """
-    def __init__(self, items: list[tuple]):
-        self._funcs = []
-        self._conds = []
+    def __init__(self, items: list[tuple], mode: str = 'sum'):
+        if mode not in ('sum', 'first'):
+            raise ValueError(f"Invalid mode: {mode}")
+        self.mode = mode
+        self._funcs  = []
+        self._conds  = []
+        self._consts = [] # value of constant functions, None otherwise
         for i in range(N := len(items)):
             self._funcs.append(self._phase_func(items[i][0]))
             self._conds.append(self._phase_cond(items[i][1]))
+            self._consts.append(items[i][0] if isinstance(items[i][0], (int, float)) else None)
+        self._set_index(self._detect_intervals([item[1] for item in items]))
+    
+    @classmethod
+    def from_breakpoints(cls, funcs: list, breakpoints: list | np.ndarray, closed: str = 'left'):
+        """piecewise function on an interval partition
+        Args:
+            funcs (list): k functions (int | float | str | 'function')
+            breakpoints (list | np.ndarray): k+1 sorted breakpoints, may include +-np.inf
+            closed (str): 'left' for pieces [b_i, b_i+1), 'right' for (b_i, b_i+1]
+        """
+        b = np.asarray(breakpoints, dtype=float)
+        if b.ndim != 1 or b.size != len(funcs) + 1:
+            raise ValueError("breakpoints must be 1-d with len(funcs) + 1 elements")
+        if np.any(np.diff(b) <= 0):
+            raise ValueError("breakpoints must be strictly increasing")
+        if closed == 'left':
+            conds = [lambda x, lo=lo, hi=hi: (x >= lo) & (x < hi) for lo, hi in zip(b[:-1], b[1:])]
+        elif closed == 'right':
+            conds = [lambda x, lo=lo, hi=hi: (x > lo) & (x <= hi) for lo, hi in zip(b[:-1], b[1:])]
+        else:
+            raise ValueError(f"Invalid closed: {closed}")
+        self = cls(list(zip(funcs, conds)), mode='first')
+        edges  = b[np.isfinite(b)]
+        pieces = np.searchsorted(b, _segment_points(edges), side='right') - 1
+        pieces[(pieces < 0) | (pieces >= len(funcs))] = -1
+        self._set_index((edges, pieces, closed, []))
+        return self
     
     def _phase_func(self, o):
         if isinstance(o, (int, float)):
             return lambda x: o
         elif isinstance(o, str):
-            return sp.lambdify('x', latex2sympy(o), 'numpy')
+            return lambdify_latex(o, ['x'])
         elif callable(o):
             return o
         else:
@@ -45,24 +90,248 @@ class Piecewise_Func(object):
     
     def _phase_cond(self, o):
         if isinstance(o, str):
-            return sp.lambdify('x', latex2sympy(o), 'numpy')
+            return lambdify_latex(o, ['x'])
         elif callable(o):
             return o
         else:
             raise ValueError(f"Invalid cond type: {type(o)}")
+    
+    def _detect_intervals(self, conds):
+        """**private function**\n
+        (edges, piece of each segment, closed, rest) indexing the pieces whose conditions are intervals in x, \\
+        `rest` lists the other pieces (evaluated by masks); None if the pieces cannot be indexed. \\
+        Bounds are read from the relations (no symbolic set algebra), overlaps are found by a sweep \\
+        over the sorted bounds, O(k log k) for k pieces
+        """
+        bounds, rest = [], []
+        for i, c in enumerate(conds):
+            b = _interval_bounds(c) if isinstance(c, str) else None
+            (rest if b is None else bounds).append(i if b is None else (i,) + b)
+        if not bounds:
+            return None
+        if self.mode == 'first' and rest and min(rest) < max(b[0] for b in bounds):
+            return None # a masked piece takes priority over an indexed one
         
-    def __call__(self, x):
-        if hasattr(x, '__iter__'): # for a sequence of x
-            res = np.zeros(len(x))
-            for func, cond in zip(self._funcs, self._conds):
-                res += np.where(cond(x), func(x), 0)
-            return res
-        else: # for single x
-            res = 0
-            for func, cond in zip(self._funcs, self._conds):
-                if cond(x):
-                    res += func(x)
-            return res
+        edges = np.unique([e for _, lo, hi, _, _ in bounds for e in (lo, hi) if np.isfinite(e)])
+        m = edges.size
+        # probes: segment 0, edge 0, segment 1, ..., edge m-1, segment m -> 2m+1 positions
+        spans = []
+        for i, lo, hi, lo_closed, hi_closed in bounds:
+            start = 0 if lo == -np.inf else 2*np.searchsorted(edges, lo) + (1 if lo_closed else 2)
+            end = 2*m if hi == np.inf else 2*np.searchsorted(edges, hi) + (1 if hi_closed else 0)
+            if start <= end:
+                spans.append((start, end, i))
+        probe = np.full(2*m + 1, -1)
+        if self.mode == 'sum':
+            cover = np.zeros(2*m + 2, dtype=int)
+            for start, end, i in spans:
+                cover[start] += 1
+                cover[end + 1] -= 1
+                probe[start:end + 1] = i
+            if np.cumsum(cover).max(initial=0) > 1:
+                return None # overlapping pieces are summed
+        else: # first piece covering each probe, sweep with a heap of the open spans
+            spans.sort()
+            heap, j = [], 0
+            for k in range(2*m + 1):
+                while j < len(spans) and spans[j][0] == k:
+                    heappush(heap, (spans[j][2], spans[j][1]))
+                    j += 1
+                while heap and heap[0][1] < k:
+                    heappop(heap)
+                if heap:
+                    probe[k] = heap[0][0]
+        
+        # every edge must belong to the segment on the same side
+        seg, at_edge = probe[::2], probe[1::2]
+        if np.array_equal(at_edge, seg[1:]):
+            closed = 'left'
+        elif np.array_equal(at_edge, seg[:-1]):
+            closed = 'right'
+        else:
+            return None
+        return edges, seg, closed, rest
+    
+    def _set_index(self, index):
+        """**private function**\n
+        sorted finite breakpoints, `_lookup[searchsorted(_edges, x, _side)]` is the piece of x (-1 for none), \
+        `_rest` are the pieces outside the index (evaluated by masks)
+        """
+        self._edges, self._rest = None, []
+        if index is None:
+            return
+        edges, pieces, closed, self._rest = index
+        self._edges  = np.asarray(edges, dtype=float)
+        self._side   = 'right' if closed == 'left' else 'left'
+        self._lookup = np.asarray(pieces)
+        self._edges_list = self._edges.tolist() # for scalar bisect
+        if all(c is not None for c in self._consts): # lookup table
+            self._values = np.append(np.asarray(self._consts, dtype=float), 0.)
+        else:
+            self._values = None
+        
+    def __call__(self, x, out: np.ndarray = None):
+        """
+        Args:
+            x (float | np.ndarray): 
+            out (np.ndarray, optional): buffer with the same shape as x
+        Returns:
+            float | np.ndarray: same shape as x, float dtype of x (float64 for int x)
+        """
+        if hasattr(x, '__iter__') or out is not None: # for a sequence of x
+            x = np.asarray(x)
+            if self._edges is None:
+                return self._eval_masked(x, out)
+            piece = self._piece(x)
+            out = self._eval_indexed(x, out, piece)
+            if self._rest:
+                self._eval_masked(x, out, self._rest, (piece < 0) if self.mode == 'first' else None)
+            return out
+        
+        res, pieces = 0, range(len(self._funcs))
+        if self._edges is not None: # for single x, bisect
+            i = -1
+            if x == x: # not nan
+                bisect = bisect_right if self._side == 'right' else bisect_left
+                i = self._lookup[bisect(self._edges_list, x)]
+            if i >= 0:
+                res = self._funcs[i](x)
+                if self.mode == 'first': return res
+            pieces = self._rest
+        for i in pieces: # for single x
+            if self._conds[i](x):
+                res += self._funcs[i](x)
+                if self.mode == 'first': break
+        return res
+    
+    def _new_out(self, x, out):
+        """**private function**\n
+        zeroed output buffer for x
+        """
+        if out is None:
+            return np.zeros(x.shape, dtype=np.result_type(x.dtype, np.float64) 
+                            if not np.issubdtype(x.dtype, np.floating) else x.dtype)
+        if out.shape != x.shape: raise ValueError(f"out.shape {out.shape} != x.shape {x.shape}")
+        out[...] = 0
+        return out
+    
+    def _eval_masked(self, x, out=None, pieces=None, left=None):
+        """**private function**\n
+        evaluate each piece only on the subset of x where its condition holds, \
+        `pieces` (with a filled `out`) restricts to some pieces, `left` to some points ('first' mode)
+        """
+        if pieces is None:
+            out, pieces = self._new_out(x, out), range(len(self._funcs))
+        if self.mode == 'first' and left is None:
+            left = np.ones(x.shape, dtype=bool)
+        for func, cond in ((self._funcs[i], self._conds[i]) for i in pieces):
+            mask = np.broadcast_to(np.asarray(cond(x), dtype=bool), x.shape)
+            if left is not None: # first match only
+                mask = mask & left
+                left &= ~mask
+            if not mask.any():
+                continue
+            if self.mode == 'first':
+                out[mask] = func(x[mask])
+            else:
+                out[mask] += func(x[mask])
+            if left is not None and not left.any():
+                break
+        return out
+    
+    def _piece(self, x):
+        """**private function**\n
+        indexed piece of each point by the sorted breakpoints, O(log k) per point, -1 for none
+        """
+        piece = self._lookup[np.searchsorted(self._edges, x, side=self._side)]
+        if np.issubdtype(x.dtype, np.floating):
+            piece[np.isnan(x)] = -1
+        return piece
+    
+    def _eval_indexed(self, x, out=None, piece=None):
+        """**private function**\n
+        dispatch each point to its piece
+        """
+        piece = self._piece(x) if piece is None else piece
+        if self._values is not None: # all pieces are constants, piece -1 -> 0
+            if out is None:
+                return self._values[piece].astype(self._new_out(x[:0], None).dtype, copy=False)
+            if out.shape != x.shape: 
+                raise ValueError(f"out.shape {out.shape} != x.shape {x.shape}")
+            out[...] = self._values[piece]
+            return out
+        
+        out = self._new_out(x, out)
+        if len(self._funcs) <= 16: # few pieces, masks are cheaper than sorting
+            for i in np.unique(piece):
+                if i < 0: continue
+                mask = piece == i
+                out[mask] = self._funcs[i](x[mask])
+            return out
+        
+        flat_x, flat_out = x.reshape(-1), out.reshape(-1)
+        order  = np.argsort(piece, axis=None, kind='stable')
+        bounds = np.cumsum(np.bincount(piece.reshape(-1) + 1, minlength=len(self._funcs) + 1))
+        for i in range(len(self._funcs)):
+            sel = order[bounds[i]:bounds[i+1]]
+            if sel.size:
+                flat_out[sel] = self._funcs[i](flat_x[sel])
+        if not np.shares_memory(flat_out, out): # out was not contiguous
+            out[...] = flat_out.reshape(x.shape)
+        return out
+
+def _interval_bounds(cond):
+    """**private function**\n
+    (lo, hi, lo_closed, hi_closed) of a condition string such as 'x < 1', '3 \\leq x' or '1 \\leq x < 3', \\
+    None if it is not an interval in x
+    """
+    import sympy as sp
+    x = sp.Symbol('x')
+    try:
+        expr = latex_to_sympy(cond)
+    except Exception:
+        return None
+    
+    def bounds(e):
+        if isinstance(e, sp.And):
+            return _intersect([bounds(a) for a in e.args])
+        if not isinstance(e, (sp.StrictLessThan, sp.LessThan, sp.StrictGreaterThan, sp.GreaterThan)):
+            return None
+        lhs, rhs = e.args
+        if isinstance(lhs, sp.core.relational.Relational): # chain: (a < x) < b
+            return _intersect([bounds(lhs), bounds(e.func(lhs.args[1], rhs, evaluate=False))])
+        less = isinstance(e, (sp.StrictLessThan, sp.LessThan))
+        closed = isinstance(e, (sp.LessThan, sp.GreaterThan))
+        if lhs == x and not rhs.free_symbols: # x < c
+            c, upper = rhs, less
+        elif rhs == x and not lhs.free_symbols: # c < x
+            c, upper = lhs, not less
+        else:
+            return None
+        try:
+            c = float(c)
+        except TypeError:
+            return None
+        return (-np.inf, c, False, closed) if upper else (c, np.inf, closed, False)
+    
+    return bounds(expr)
+
+def _intersect(parts):
+    """**private function**\n
+    intersection of (lo, hi, lo_closed, hi_closed) bounds, None if any part is None
+    """
+    if any(p is None for p in parts):
+        return None
+    lo, hi = max(p[0] for p in parts), min(p[1] for p in parts)
+    return (lo, hi, all(p[2] for p in parts if p[0] == lo), all(p[3] for p in parts if p[1] == hi))
+
+def _segment_points(edges):
+    """**private function**\n
+    one point inside each of the len(edges)+1 segments cut by sorted finite edges
+    """
+    if edges.size == 0:
+        return np.zeros(1)
+    return np.concatenate([[edges[0] - 1], (edges[:-1] + edges[1:]) / 2, [edges[-1] + 1]])
 
 class Delta_Func(object):
     def __init__(self, x, dx=1e-4):
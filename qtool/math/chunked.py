@@ -0,0 +1,163 @@
+# Out-of-core vector calculus, chunked over memory-mapped / sliceable arrays
+# ==================================================
+import numpy as np
+
+from .numerical import _sl, _fused_sum, _curl_terms, _args_check_VectorCalculus
+# ==================================================
+__all__ = ['chunked_gradient', 'chunked_divergence', 'chunked_curl']
+# ==================================================
+
+def _args_check_chunked(*arrs, h=None):
+    """**private function**\n
+    `_args_check_VectorCalculus`, plus equal shapes (the chunks are read by index) \n
+    and uniform intervals (the 3 pts stencils of `_fused_sum`)
+    """
+    Ndim, h = _args_check_VectorCalculus(*arrs, h=h)
+    if any(tuple(arr.shape) != tuple(arrs[0].shape) for arr in arrs):
+        raise ValueError("All arrays must have the same shape")
+    if any(np.ndim(h_i) != 0 for h_i in h):
+        raise ValueError("h must be numbers, the chunked operators are for uniform grids")
+    return Ndim, h
+
+def _open_sink(out, shape, dtype):
+    """**private function**\n
+    None -> in-memory array, str -> new .npy memmap at that path, else the given sink
+    """
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if isinstance(out, str):
+        return np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+    if tuple(out.shape) != tuple(shape):
+        raise ValueError(f"out.shape {tuple(out.shape)} != {tuple(shape)}")
+    return out
+
+def _chunk_size(arrs, n_in, axis, max_bytes):
+    """**private function**\n
+    number of planes along axis per chunk, so that the inputs (with halo) and output fit max_bytes
+    """
+    shape = arrs[0].shape
+    plane = int(np.prod(shape)) // shape[axis] * np.dtype(np.result_type(arrs[0].dtype, float)).itemsize
+    return max(1, int(max_bytes // ((n_in + 1) * plane)) - 4)
+
+def _run_chunked(arrs, h, terms_list, sinks, chunk_axis=0, chunk_size=None, max_bytes=2**28):
+    """**private function**\n
+    stream chunks of arrs along `chunk_axis` (with the halos of the 3 pts stencils) and \n
+    write `sum(sign * dY/dx_axis for Y, axis, sign in terms)` of each terms in terms_list to its sink\n
+    terms refer to arrs by index: (i_arr, axis, sign)
+    """
+    shape, t = tuple(arrs[0].shape), chunk_axis
+    n, nd = shape[t], len(shape)
+    if chunk_size is None:
+        chunk_size = _chunk_size(arrs, len(arrs), t, max_bytes)
+    halo = any(axis == t for terms in terms_list for _, axis, _ in terms)
+    if halo and n < 3: raise ValueError("Y must have at least 3 elements")
+    used = sorted({i for terms in terms_list for i, _, _ in terms})
+    
+    buf = None
+    for lo in range(0, n, chunk_size):
+        hi = min(lo + chunk_size, n)
+        if halo: # 1 point halo, 3 points at the boundaries for the one-sided stencils
+            r0 = max(lo - 1, 0) if hi < n else min(max(lo - 1, 0), n - 3)
+            r1 = min(hi + 1, n) if lo > 0 else max(min(hi + 1, n), 3)
+        else:
+            r0, r1 = lo, hi
+        slabs = {i: np.asarray(arrs[i][_sl(nd, t, slice(r0, r1))]) for i in used}
+        if buf is None or buf.shape[t] != hi - lo:
+            buf_shape = list(shape)
+            buf_shape[t] = hi - lo
+            buf = np.empty(buf_shape, dtype=np.result_type(*slabs.values(), float))
+        for terms, sink in zip(terms_list, sinks):
+            local = [(slabs[i], axis, sign) for i, axis, sign in terms]
+            _fused_sum(local, h, buf, tile=(t, lo - r0, hi - r0))
+            sink[_sl(nd, t, slice(lo, hi))] = buf
+    for sink in sinks:
+        if hasattr(sink, 'flush'): sink.flush()
+    return sinks
+
+def chunked_gradient(*arrs, h: float | tuple[float] = None, out: list = None, 
+                     chunk_axis: int = 0, chunk_size: int = None, max_bytes: int = 2**28) -> list:
+    """`gradient` of arrays larger than memory, streamed in chunks along `chunk_axis`\n
+    same stencils and boundary handling as `gradient` (`fdd_2pt_central`, `fdd_3pt_forward`, `fdd_3pt_backward`)
+    Args:
+        arrs (*np.memmap | array-like): n-d arrays, any object with `shape`, `dtype` and slice reads \\
+            (np.memmap, h5py / netCDF4 variables, zarr arrays, ...)
+        h (float | tuple[float], optional): interval size, default is 1 for all dimensions
+        out (list, optional): one sink per component, an array-like supporting slice writes \\
+            (e.g. np.memmap) or a str path of a new .npy memmap, default is in-memory arrays
+        chunk_axis (int): axis to stream along, the outermost (0) is contiguous for C-order files
+        chunk_size (int, optional): planes per chunk, default is derived from max_bytes
+        max_bytes (int): approx. memory of one chunk (inputs with halo and output)
+    Returns:
+        list: the sinks
+    Example:
+        ```python
+        u = np.load('u.npy', mmap_mode='r')
+        v = np.load('v.npy', mmap_mode='r')
+        du_dx, dv_dy = chunked_gradient(u, v, h=(dx, dy), out=['du_dx.npy', 'dv_dy.npy'])
+        ```
+    """
+    Ndim, h = _args_check_chunked(*arrs, h=h)
+    dtype = np.result_type(arrs[0].dtype, float)
+    sinks = [_open_sink(None if out is None else out[i], arrs[0].shape, dtype) for i in range(Ndim)]
+    for i in range(Ndim): # one component at a time, only arrs[i] is read
+        _run_chunked(arrs, h, [[(i, i, 1)]], [sinks[i]], chunk_axis, chunk_size, max_bytes)
+    return sinks
+
+def chunked_divergence(*arrs, h: float | tuple[float] = None, out=None, 
+                       chunk_axis: int = 0, chunk_size: int = None, max_bytes: int = 2**28):
+    """`divergence` of arrays larger than memory, see `chunked_gradient`
+    Args:
+        out (optional): sink or str path of a new .npy memmap, default is an in-memory array
+    """
+    Ndim, h = _args_check_chunked(*arrs, h=h)
+    sink = _open_sink(out, arrs[0].shape, np.result_type(arrs[0].dtype, float))
+    return _run_chunked(arrs, h, [[(i, i, 1) for i in range(Ndim)]], [sink], 
+                        chunk_axis, chunk_size, max_bytes)[0]
+
+def chunked_curl(*arrs, h: float | tuple[float] = None, out=None, 
+                 chunk_axis: int = 0, chunk_size: int = None, max_bytes: int = 2**28):
+    """`curl` of 2 or 3-d arrays larger than memory, see `chunked_gradient`
+    Args:
+        out (optional): sink (2-d) or list of 3 sinks (3-d), or str path(s) of new .npy memmaps
+    Returns:
+        the sink (2-d) or list of 3 sinks (3-d)
+    """
+    Ndim, h = _args_check_chunked(*arrs, h=h)
+    if Ndim not in (2, 3):
+        raise ValueError("curl is only for 2 or 3-d arrays")
+    dtype = np.result_type(arrs[0].dtype, float)
+    n_out = 1 if Ndim == 2 else 3
+    outs  = [out] if Ndim == 2 else (out if out is not None else [None] * 3)
+    sinks = [_open_sink(outs[i], arrs[0].shape, dtype) for i in range(n_out)]
+    terms_list = _curl_terms(list(range(Ndim))) # terms by index of arrs
+    _run_chunked(arrs, h, terms_list, sinks, chunk_axis, chunk_size, max_bytes)
+    return sinks[0] if Ndim == 2 else sinks
+
+# ==================================================
+
+def main():
+    import os
+    import tempfile
+    from time import perf_counter
+    from .numerical import divergence
+    
+    tmp = tempfile.mkdtemp()
+    shape = (200, 200, 50)
+    arrs = []
+    for name in 'uvw':
+        arr = np.lib.format.open_memmap(os.path.join(tmp, f'{name}.npy'), mode='w+', dtype=np.float32, shape=shape)
+        arr[:] = np.random.rand(*shape)
+        arr.flush()
+        arrs.append(np.load(os.path.join(tmp, f'{name}.npy'), mmap_mode='r'))
+    t0 = perf_counter()
+    div = chunked_divergence(*arrs, h=(1., 2., 3.), out=os.path.join(tmp, 'div.npy'), max_bytes=2**22)
+    print(f'chunked: {(perf_counter() - t0)*1e3:.1f} ms, max err: '
+          f'{np.abs(div - divergence(*map(np.asarray, arrs), h=(1., 2., 3.))).max():.3g}')
+
+# ==================================================
+from time import perf_counter
+if __name__ == '__main__':
+    start_time = perf_counter()
+    main()
+    end_time = perf_counter()
+    print('\ntime :%.3f ms' %((end_time - start_time)*1000))
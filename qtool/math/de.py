@@ -1,17 +1,47 @@
 # _summary_
 # ==================================================
 import numpy as np
-import sympy as sp
-from latex2sympy2 import latex2sympy
+# sympy is imported lazily in `ODE` (slow to import)
+
+from .expr import latex_to_sympy, lambdify_latex
+# ==================================================
+__all__ = ['ODE', 'ODE_System', 'ODE_Solver']
 # ==================================================
-__all__ = ['ODE', 'ODE_Solver']
+
+# Dormand-Prince 5(4) tableau, error weights (B5 - B4) and dense output coefficients
+_DP_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1, 1])
+_DP_A = [
+    [],
+    [1/5],
+    [3/40, 9/40],
+    [44/45, -56/15, 32/9],
+    [19372/6561, -25360/2187, 64448/6561, -212/729],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+    [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84],
+]
+_DP_E = np.array([-71/57600, 0, 71/16695, -71/1920, 17253/339200, -22/525, 1/40])
+_DP_P = np.array([
+    [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+    [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+    [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+    [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+    [0, 40617522/29380423, -110615467/29380423, 69997945/29380423],
+])
 # ==================================================
 
 class ODE(object):
-    """"""
-    def __init__(self, eq: str, forcing: None | str = None):
+    """n-th order ODE `y_n = f(x, y, y_1, ..., y_{n-1}, *params) + forcing(x)`
+    Args:
+        eq (str): LaTeX equation, e.g. 'y_2 = -k y'
+        forcing (None | str | 'function'): forcing term of x
+        params (list[str], optional): names of free parameters in `eq`, e.g. ['k'], \
+            given per member in `ODE_Solver.solve(..., params=...)`
+    """
+    def __init__(self, eq: str, forcing: None | str = None, params: None | list[str] = None):
         try:
-            self.eq = latex2sympy(eq)
+            self.eq = latex_to_sympy(eq)
             lhs, rhs = eq.split('=')
             self.order = int(lhs[lhs.find('y_') + 2:])
         except Exception as e:
@@ -19,55 +49,462 @@ class ODE(object):
         if forcing is None:
             self.forcing = lambda x: 0
         elif isinstance(forcing, str):
-            self.forcing = sp.lambdify(sp.symbols('x'), latex2sympy(forcing), 'numpy')
+            self.forcing = lambdify_latex(forcing, ['x'])
         else:
             self.forcing = forcing
 
-        self.varnames = ['x', 'y'] + [f'y_{i}' for i in range(1, self.order)]
-        self._yn = sp.lambdify(sp.symbols(self.varnames), self.eq, modules='numpy')
+        self.params   = list(params) if params is not None else []
+        self.varnames = ['x', 'y'] + [f'y_{i}' for i in range(1, self.order)] + self.params
+        self._yn = lambdify_latex(eq, self.varnames)
         self._Y = np.zeros(self.order) # array: [y, y', y'',... y_n-1]
             
-    def __call__(self, x, Y):
+    def __call__(self, x, Y, *params):
         """
         Args:
             x (float): 
-            Y (np.ndarray): shape (order,), [y, y', y'',... y_n-1]
+            Y (np.ndarray): shape (order,) or (n_members, order), [y, y', y'',... y_n-1]
+            params (*float | *np.ndarray): one value or one (n_members,) array per parameter
             """
-        return self._yn(x, *Y) + self.forcing(x)
+        return self._yn(x, *np.moveaxis(np.asarray(Y), -1, 0), *params) + self.forcing(x)
+    
+    def rhs(self, x, Y, *params, out: np.ndarray = None):
+        """first-order system form, dY/dx = [y', y'',... y_n]
+        Args:
+            x (float): 
+            Y (np.ndarray): shape (order,) or (n_members, order)
+            params (*float | *np.ndarray): see `__call__`
+            out (np.ndarray, optional): buffer with the same shape as Y
+        """
+        if out is None: 
+            out = np.empty(np.shape(Y))
+        out[..., :-1] = Y[..., 1:]
+        out[..., -1]  = self(x, Y, *params)
+        return out
+    
+    def jacobian(self, x, Y, *params):
+        """Jacobian of `rhs` w.r.t. Y (symbolic derivatives of `eq`)
+        Returns:
+            np.ndarray: shape (order, order) or (n_members, order, order)
+        """
+        if not hasattr(self, '_dyn'):
+            import sympy as sp
+            syms = sp.symbols(self.varnames)
+            self._dyn = [sp.lambdify(syms, self.eq.diff(s), modules='numpy') 
+                         for s in syms[1:self.order+1]]
+        Y = np.asarray(Y)
+        J = np.zeros(Y.shape + (self.order,))
+        idx = np.arange(self.order - 1)
+        J[..., idx, idx+1] = 1
+        args = (x, *np.moveaxis(Y, -1, 0), *params)
+        for j, dyn in enumerate(self._dyn):
+            J[..., -1, j] = dyn(*args)
+        return J
+
+class ODE_System(object):
+    """system of first-order ODEs `u_i' = f_i(x, u_1, ..., u_n, *params)`
+    Args:
+        eqs (list[str]): LaTeX equations, the lhs is the name of the state, \
+            e.g. ['a = -0.04 a + 10^{4} b c', 'b = 0.04 a - 10^{4} b c - 3 \\times 10^{7} b^2', 'c = 3 \\times 10^{7} b^2']
+        params (list[str], optional): names of free parameters in `eqs`, see `ODE`
+    Note:
+        the Jacobian is derived symbolically, it is used by `ODE_Solver.solve_stiff`
+    """
+    def __init__(self, eqs: list[str], params: None | list[str] = None):
+        import sympy as sp
+        
+        self.states = [eq.split('=')[0].strip() for eq in eqs]
+        self.eqs    = [latex_to_sympy(eq) for eq in eqs]
+        self.order  = len(eqs)
+        self.params = list(params) if params is not None else []
+        self.varnames = ['x'] + self.states + self.params
+        
+        syms = sp.symbols(self.varnames)
+        self.jac = sp.Matrix(self.eqs).jacobian(syms[1:self.order+1])
+        self._fs   = [lambdify_latex(eq, self.varnames) for eq in eqs]
+        self._dfs  = [[sp.lambdify(syms, self.jac[i, j], modules='numpy') for j in range(self.order)]
+                      for i in range(self.order)]
+        
+    def __call__(self, x, Y, *params):
+        """
+        Args:
+            x (float): 
+            Y (np.ndarray): shape (order,) or (n_members, order), states in the order of `eqs`
+            params (*float | *np.ndarray): see `ODE.__call__`
+        """
+        return self.rhs(x, Y, *params)
+    
+    def rhs(self, x, Y, *params, out: np.ndarray = None):
+        """dY/dx, see `ODE.rhs`"""
+        if out is None: 
+            out = np.empty(np.shape(Y))
+        args = (x, *np.moveaxis(np.asarray(Y), -1, 0), *params)
+        for i, f in enumerate(self._fs):
+            out[..., i] = f(*args)
+        return out
+    
+    def jacobian(self, x, Y, *params):
+        """Jacobian of `rhs` w.r.t. Y
+        Returns:
+            np.ndarray: shape (order, order) or (n_members, order, order)
+        """
+        Y = np.asarray(Y)
+        J = np.empty(Y.shape + (self.order,))
+        args = (x, *np.moveaxis(Y, -1, 0), *params)
+        for i in range(self.order):
+            for j in range(self.order):
+                J[..., i, j] = self._dfs[i][j](*args)
+        return J
         
 class ODE_Solver(object):
-    """"""
-    def __init__(self, ode: ODE, ic: list | np.ndarray):
+    """
+    Args:
+        ode (ODE | ODE_System): 
+        ic (list | np.ndarray): shape (order,), or (n_members, order) for an ensemble \
+            which is integrated in one vectorized pass
+    """
+    def __init__(self, ode: ODE | ODE_System, ic: list | np.ndarray):
         self.ode = ode
-        self._ic  = ic
-        if self.ode.order != len(self.ic): raise ValueError('ic length not match order of ode.')
+        self.ic  = ic
         
     @property
     def ic(self):
         return self._ic
     @ic.setter
     def ic(self, value):
-        if len(value) != self.ode.order: raise ValueError('ic length not match order of ode.')
+        if np.shape(value)[-1] != self.ode.order: raise ValueError('ic length not match order of ode.')
+        self._ic = value
     
-    def solve(self, x0, x1, dx=.01, method='Euler'):
+    def solve(self, x0, x1, dx=.01, method='Euler', params=None):
         """solve ode from x0 to x1 with step dx
         Args:
             x0 (float): start point of x
             x1 (float): end point of x
             dx (float): step size
-            method (str): 'Euler' or 'RK4'"""
+            method (str): 'Euler' or 'RK4'
+            params (list | np.ndarray, optional): values of `ode.params`, shape (n_params,) \
+                shared by all members or (n_members, n_params)
+        Returns:
+            x (np.ndarray): shape (nx,)
+            Y (np.ndarray): shape (nx, order) or (nx, n_members, order)"""
         x = np.arange(x0, x1, dx)
-        Y = np.zeros((x.size, self.ode.order))
-        Y[0] = self.ic
+        ic = np.asarray(self.ic, dtype=float)
+        Y = np.zeros((x.size,) + ic.shape)
+        Y[0] = ic
+        step = self._stepper(method, ic.shape, params)
+        for i in range(1, x.size):
+            step(dx, x[i-1], Y[i-1], Y[i])
+        return x, Y
+    
+    def iter_solve(self, x0, x1, dx=.01, method='Euler', params=None, chunk_size=1024, every=1):
+        """solve ode like `solve`, but yield the result in blocks with bounded memory
+        Args:
+            x0, x1, dx, method, params: see `solve`
+            chunk_size (int): max number of output points per block
+            every (int): output decimation, keep every `every`-th step (the first step is kept)
+        Yields:
+            x (np.ndarray): shape (<=chunk_size,)
+            Y (np.ndarray): shape (<=chunk_size, order) or (<=chunk_size, n_members, order)
+        Note:
+            the block buffers are reused, copy a block to keep it after the next iteration
+        Example:
+            ```python
+            for x, Y in ODE_Solver(ode, ic).iter_solve(0, 1e4, dx=1e-3, method='RK4', every=100):
+                np.save(f'{x[0]:.0f}.npy', Y)
+            ```
+        """
+        if every < 1 or chunk_size < 1: raise ValueError('every and chunk_size must be >= 1.')
+        n  = max(int(np.ceil((x1 - x0) / dx)), 0) # == len(np.arange(x0, x1, dx))
+        ic = np.asarray(self.ic, dtype=float)
+        step = self._stepper(method, ic.shape, params)
+        
+        xb = np.empty(chunk_size)
+        Yb = np.empty((chunk_size,) + ic.shape)
+        Y, Y_next = ic.copy(), np.empty(ic.shape)
+        k = 0 # filled in block
+        for i in range(n):
+            if i > 0:
+                step(dx, x0 + (i-1)*dx, Y, Y_next)
+                Y, Y_next = Y_next, Y
+            if i % every == 0:
+                xb[k] = x0 + i*dx
+                Yb[k] = Y
+                k += 1
+                if k == chunk_size:
+                    yield xb, Yb
+                    k = 0
+        if k > 0:
+            yield xb[:k], Yb[:k]
+    
+    def solve_reduce(self, x0, x1, reducer, init=None, dx=.01, method='Euler', params=None, 
+                     chunk_size=1024, every=1):
+        """solve ode blockwise and fold the blocks with `reducer`, nothing else is kept
+        Args:
+            reducer ('function'): `acc = reducer(acc, x, Y)` for each block from `iter_solve`
+            init: initial value of acc
+            others: see `iter_solve`
+        Returns:
+            acc: the reduced value
+        Example:
+            ```python
+            # running maximum of y of every member
+            ymax = solver.solve_reduce(0, 1e4, lambda acc, x, Y: np.maximum(acc, Y[..., 0].max(axis=0)),
+                                       init=-np.inf, dx=1e-3, method='RK4')
+            ```
+        """
+        acc = init
+        for x, Y in self.iter_solve(x0, x1, dx, method, params, chunk_size, every):
+            acc = reducer(acc, x, Y)
+        return acc
+    
+    def solve_adaptive(self, x0, x1, rtol=1e-6, atol=1e-9, x_eval=None, dx0=None, max_dx=np.inf,
+                       params=None, max_steps=100000):
+        """solve ode from x0 to x1 with adaptive step, embedded Runge-Kutta 5(4) (Dormand-Prince)
+        Args:
+            x0 (float): start point of x
+            x1 (float): end point of x
+            rtol, atol (float): relative and absolute tolerance of the local error
+            x_eval (np.ndarray, optional): x where the solution is returned (by dense output), \
+                default is the accepted step points
+            dx0 (float, optional): initial step size, default is estimated
+            max_dx (float): maximum step size
+            params (list | np.ndarray, optional): see `solve`
+            max_steps (int): maximum number of attempted steps
+        Returns:
+            x (np.ndarray): shape (nx,)
+            Y (np.ndarray): shape (nx, order) or (nx, n_members, order)
+            stats (dict): 'n_steps' (accepted), 'n_rejected', 'n_feval' (rhs evaluations)
+        Note:
+            an ensemble shares one step size, controlled by the member with the largest error
+        """
+        p   = self._params_args(params)
+        rhs = self.ode.rhs
+        ic  = np.asarray(self.ic, dtype=float)
+        d   = np.sign(x1 - x0)
+        if d == 0: raise ValueError('x1 must be different from x0.')
+        x_eval = self._check_x_eval(x_eval, x0, x1)
+        
+        def err_norm(E, Y, Y_new):
+            scale = atol + rtol * np.maximum(np.abs(Y), np.abs(Y_new))
+            return np.sqrt(np.mean((E / scale)**2, axis=-1)).max()
+        
+        K = np.empty((7,) + ic.shape) # stage buffers
+        tmp = np.empty(ic.shape)
+        Y   = ic.copy()
+        x   = x0
+        rhs(x, Y, *p, out=K[0])
+        stats = {'n_steps': 0, 'n_rejected': 0, 'n_feval': 1}
+        
+        if dx0 is None: # initial step, Hairer et al. (1993)
+            scale = atol + rtol * np.abs(Y)
+            d0, d1 = np.sqrt(np.mean((Y/scale)**2)), np.sqrt(np.mean((K[0]/scale)**2))
+            h0 = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+            rhs(x + d*h0, Y + d*h0*K[0], *p, out=tmp)
+            stats['n_feval'] += 1
+            d2 = np.sqrt(np.mean(((tmp - K[0])/scale)**2)) / h0
+            h1 = max(1e-6, h0*1e-3) if max(d1, d2) <= 1e-15 else (0.01 / max(d1, d2))**(1/5)
+            dx0 = min(100*h0, h1)
+        h = min(abs(dx0), max_dx, abs(x1 - x0))
+        
+        xs, Ys = [x0], [ic.copy()]
+        i_eval = 0 if x_eval is None else self._x_eval_stop(x_eval, 0, x0, d)
+        if x_eval is not None: # leave ic only if x_eval starts at x0
+            xs, Ys = xs[:i_eval], Ys[:i_eval]
+        
+        while d * (x1 - x) > 0:
+            if stats['n_steps'] + stats['n_rejected'] >= max_steps:
+                raise RuntimeError(f'max_steps ({max_steps}) reached at x = {x}.')
+            h = min(h, abs(x1 - x))
+            x_new = x + d*h if h < abs(x1 - x) else x1
+            hs = x_new - x # signed step
+            for i in range(1, 7):
+                np.multiply(K[0], hs * _DP_A[i][0], out=tmp)
+                for j in range(1, i):
+                    tmp += (hs * _DP_A[i][j]) * K[j]
+                tmp += Y
+                rhs(x + _DP_C[i]*hs, tmp, *p, out=K[i] if i < 6 else K[6])
+            # tmp is now the 5th order solution (row 6 of A is B), K[6] = f(x_new, Y_new)
+            Y_new = tmp.copy()
+            E = hs * np.tensordot(_DP_E, K, axes=1)
+            stats['n_feval'] += 6
+            
+            err = err_norm(E, Y, Y_new)
+            if err <= 1:
+                if x_eval is None:
+                    xs.append(x_new); Ys.append(Y_new)
+                else: # dense output on (x, x_new]
+                    j = self._x_eval_stop(x_eval, i_eval, x_new, d)
+                    if j > i_eval:
+                        theta = (x_eval[i_eval:j] - x) / hs
+                        pw = np.cumprod(np.tile(theta[:, None], 4), axis=1) # [theta, ..., theta^4]
+                        Q  = np.tensordot(_DP_P, K, axes=([0], [0]))        # (4, *shape)
+                        Ye = Y + hs * np.tensordot(pw, Q, axes=1)
+                        xs.extend(x_eval[i_eval:j]); Ys.extend(Ye)
+                        i_eval = j
+                x, Y = x_new, Y_new
+                K[0] = K[6] # FSAL
+                stats['n_steps'] += 1
+                factor = 10 if err == 0 else min(10, 0.9 * err**(-1/5))
+            else:
+                stats['n_rejected'] += 1
+                factor = max(0.2, 0.9 * err**(-1/5))
+            h = min(h * factor, max_dx)
+        return np.array(xs), np.array(Ys).reshape((len(xs),) + ic.shape), stats
+    
+    def solve_stiff(self, x0, x1, rtol=1e-4, atol=1e-8, x_eval=None, dx0=None, max_dx=np.inf,
+                    params=None, max_steps=100000):
+        """solve stiff ode from x0 to x1 with adaptive step, 
+        2-stage L-stable Rosenbrock method ROS2 (Verwer et al., 1999) using `ode.jacobian`
+        Args:
+            x0 (float): start point of x
+            x1 (float): end point of x
+            rtol, atol (float): relative and absolute tolerance of the local error
+            x_eval (np.ndarray, optional): x where the solution is returned (cubic Hermite interpolation), \
+                default is the accepted step points
+            dx0 (float, optional): initial step size, default is `1e-6 * |x1 - x0|`
+            max_dx (float): maximum step size
+            params (list | np.ndarray, optional): see `solve`
+            max_steps (int): maximum number of attempted steps
+        Returns:
+            x (np.ndarray): shape (nx,)
+            Y (np.ndarray): shape (nx, order) or (nx, n_members, order)
+            stats (dict): 'n_steps', 'n_rejected', 'n_feval', 'n_jeval' (Jacobian evaluations), \
+                'n_solve' (linear solves)
+        Example:
+            ```python
+            ode = ODE_System(['a = -0.04 a + 10^{4} b c',
+                              'b = 0.04 a - 10^{4} b c - 3 \\times 10^{7} b^2',
+                              'c = 3 \\times 10^{7} b^2'])
+            x, Y, stats = ODE_Solver(ode, [1, 0, 0]).solve_stiff(0, 1e5, x_eval=np.logspace(-5, 5, 11))
+            ```
+        """
+        p   = self._params_args(params)
+        rhs = self.ode.rhs
+        ic  = np.asarray(self.ic, dtype=float)
+        d   = np.sign(x1 - x0)
+        if d == 0: raise ValueError('x1 must be different from x0.')
+        x_eval = self._check_x_eval(x_eval, x0, x1)
+        gamma = 1 + 1 / np.sqrt(2)
+        I = np.eye(ic.shape[-1])
+        
+        Y  = ic.copy()
+        x  = x0
+        F0 = rhs(x, Y, *p)
+        stats = {'n_steps': 0, 'n_rejected': 0, 'n_feval': 1, 'n_jeval': 0, 'n_solve': 0}
+        h = min(abs(dx0) if dx0 is not None else 1e-6 * abs(x1 - x0), max_dx, abs(x1 - x0))
+        
+        xs, Ys = [x0], [ic.copy()]
+        i_eval = 0 if x_eval is None else self._x_eval_stop(x_eval, 0, x0, d)
+        if x_eval is not None:
+            xs, Ys = xs[:i_eval], Ys[:i_eval]
+        
+        J = self.ode.jacobian(x, Y, *p)
+        stats['n_jeval'] += 1
+        while d * (x1 - x) > 0:
+            if stats['n_steps'] + stats['n_rejected'] >= max_steps:
+                raise RuntimeError(f'max_steps ({max_steps}) reached at x = {x}.')
+            h = min(h, abs(x1 - x))
+            x_new = x + d*h if h < abs(x1 - x) else x1
+            hs = x_new - x
+            W  = I - (gamma * hs) * J
+            k1 = np.linalg.solve(W, F0[..., None])[..., 0]
+            k2 = np.linalg.solve(W, (rhs(x_new, Y + hs*k1, *p) - 2*k1)[..., None])[..., 0]
+            Y_new = Y + hs * (1.5*k1 + 0.5*k2)
+            E     = 0.5 * hs * (k1 + k2)     # difference to linearly implicit Euler
+            stats['n_feval'] += 1
+            stats['n_solve'] += 2
+            
+            scale = atol + rtol * np.maximum(np.abs(Y), np.abs(Y_new))
+            err   = np.sqrt(np.mean((E / scale)**2, axis=-1)).max()
+            if err <= 1 and np.all(np.isfinite(Y_new)):
+                F1 = rhs(x_new, Y_new, *p)
+                stats['n_feval'] += 1
+                if x_eval is None:
+                    xs.append(x_new); Ys.append(Y_new)
+                else: # cubic Hermite on (x, x_new]
+                    j = self._x_eval_stop(x_eval, i_eval, x_new, d)
+                    if j > i_eval:
+                        t   = ((x_eval[i_eval:j] - x) / hs).reshape((-1,) + (1,) * Y.ndim)
+                        h00, h10 = (1 + 2*t) * (1 - t)**2, t * (1 - t)**2
+                        h01, h11 = t**2 * (3 - 2*t), t**2 * (t - 1)
+                        Ye = h00*Y + h10*hs*F0 + h01*Y_new + h11*hs*F1
+                        xs.extend(x_eval[i_eval:j]); Ys.extend(Ye)
+                        i_eval = j
+                x, Y, F0 = x_new, Y_new, F1
+                stats['n_steps'] += 1
+                J = self.ode.jacobian(x, Y, *p)
+                stats['n_jeval'] += 1
+                factor = 5 if err == 0 else min(5, 0.9 * err**(-1/2))
+            else:
+                stats['n_rejected'] += 1
+                factor = 0.2 if not np.isfinite(err) else max(0.2, 0.9 * err**(-1/2))
+            h = min(h * factor, max_dx)
+        return np.array(xs), np.array(Ys).reshape((len(xs),) + ic.shape), stats
+    
+    @staticmethod
+    def _check_x_eval(x_eval, x0, x1):
+        """**private function**\n
+        x_eval must be sorted along the direction of integration and in [x0, x1]
+        """
+        if x_eval is None:
+            return None
+        d = np.sign(x1 - x0)
+        x_eval = np.asarray(x_eval, dtype=float).reshape(-1)
+        if np.any(d * np.diff(x_eval) < 0) or np.any(d * (x_eval - x0) < 0) or np.any(d * (x_eval - x1) > 0):
+            raise ValueError('x_eval must be sorted along the direction of integration and in [x0, x1].')
+        return x_eval
+    
+    @staticmethod
+    def _x_eval_stop(x_eval, i, x, d):
+        """**private function**\n
+        first index j >= i with x_eval[j] beyond x
+        """
+        while i < x_eval.size and d * (x_eval[i] - x) <= 0:
+            i += 1
+        return i
+    
+    def _params_args(self, params):
+        """**private function**\n
+        split params of shape (n_params,) or (n_members, n_params) into per-parameter args
+        """
+        if len(self.ode.params) == 0:
+            return ()
+        if params is None:
+            raise ValueError(f'params {self.ode.params} of ode are not given.')
+        params = np.asarray(params, dtype=float)
+        if params.shape[-1] != len(self.ode.params):
+            raise ValueError(f'params length not match ode.params ({len(self.ode.params)}).')
+        return tuple(np.moveaxis(params, -1, 0))
+    
+    def _stepper(self, method, shape, params=None):
+        """**private function**\n
+        fixed step function `step(dx, x, Y, out)` with preallocated stage buffers, \
+        works on Y of shape (order,) or (n_members, order)
+        """
+        p   = self._params_args(params)
+        rhs = self.ode.rhs
         if method == 'Euler':
-            for i in range(1, x.size):
-                Y[i] = self.step_Euler(dx, self.ode, x[i-1], Y[i-1])
+            k1 = np.empty(shape)
+            def step(dx, x, Y, out):
+                rhs(x, Y, *p, out=k1)
+                np.multiply(k1, dx, out=out)
+                out += Y
         elif method == 'RK4':
-            for i in range(1, x.size):
-                Y[i] = self.step_RK4(dx, self.ode, x[i-1], Y[i-1])
+            k1, k2, k3, k4, tmp = (np.empty(shape) for _ in range(5))
+            def step(dx, x, Y, out):
+                rhs(x, Y, *p, out=k1)
+                np.multiply(k1, dx/2, out=tmp); np.add(tmp, Y, out=tmp)
+                rhs(x + dx/2, tmp, *p, out=k2)
+                np.multiply(k2, dx/2, out=tmp); np.add(tmp, Y, out=tmp)
+                rhs(x + dx/2, tmp, *p, out=k3)
+                np.multiply(k3, dx, out=tmp); np.add(tmp, Y, out=tmp)
+                rhs(x + dx, tmp, *p, out=k4)
+                np.add(k2, k3, out=out); out *= 2
+                out += k1; out += k4
+                out *= dx / 6
+                out += Y
         else:
             raise ValueError(f'Method {method} not supported.')
-        return x, Y
+        return step
 
     @staticmethod
     def step_Euler(dx, f, x, Y):
@@ -76,9 +513,9 @@ class ODE_Solver(object):
     @staticmethod
     def step_RK4(dx, f, x, Y):
         k1 = np.append(Y[1:], f(x, Y)) * dx
-        k2 = np.append(Y[1:] + k1[1:]/2, f(x, Y + k1/2)) * dx
-        k3 = np.append(Y[1:] + k2[1:]/2, f(x, Y + k2/2)) * dx
-        k4 = np.append(Y[1:] + k3[1:], f(x, Y + k3)) * dx
+        k2 = np.append(Y[1:] + k1[1:]/2, f(x + dx/2, Y + k1/2)) * dx
+        k3 = np.append(Y[1:] + k2[1:]/2, f(x + dx/2, Y + k2/2)) * dx
+        k4 = np.append(Y[1:] + k3[1:], f(x + dx, Y + k3)) * dx
         return Y + (k1 + 2*k2 + 2*k3 + k4) / 6
 
 # ==================================================
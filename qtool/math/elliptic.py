@@ -0,0 +1,293 @@
+# Poisson / Helmholtz solvers: FFT (periodic) and geometric multigrid (2-d)
+# ==================================================
+import numpy as np
+# ==================================================
+__all__ = ['poisson_fft', 'poisson_mg', 'streamfunction', 'velocity_potential']
+# ==================================================
+
+def _h_tuple(h, Ndim):
+    """**private function**\n
+    one uniform interval per dimension
+    """
+    if h is None:
+        return (1.,) * Ndim
+    if np.ndim(h) == 0:
+        return (float(h),) * Ndim
+    if len(h) != Ndim or any(np.ndim(h_i) != 0 for h_i in h):
+        raise ValueError(f"h must be a float or {Ndim} floats (uniform grid)")
+    return tuple(map(float, h))
+
+# FFT
+# ==================================================
+
+def poisson_fft(f: np.ndarray, h: float | tuple[float] = None, lam: float = 0., 
+                discrete: bool = False, out: np.ndarray = None) -> np.ndarray:
+    """solve `laplacian(u) - lam * u = f` on a periodic n-d domain, O(N log N)\n
+    Args:
+        f (np.ndarray): n-d right hand side, the end point of each period is not repeated
+        h (float | tuple[float], optional): interval size, default is 1 for all dimensions
+        lam (float): Helmholtz coefficient (>= 0), 0 for Poisson
+        discrete (bool): invert the compact 3 points per axis laplacian `(u[i-1] - 2u[i] + u[i+1]) / h^2` \\
+            (periodic) instead of the exact one, i.e. `numerical.laplacian(u, h)` (accuracy 2) reproduces f \\
+            to round off away from the boundary points, where `numerical` uses one-sided stencils
+    Returns:
+        u (np.ndarray): solution, with zero mean when lam == 0 (the mean of f is ignored)
+    Example:
+        ```python
+        x = np.arange(64) * 2*np.pi/64
+        X, Y = np.meshgrid(x, x, indexing='ij')
+        u = poisson_fft(-2*np.sin(X)*np.sin(Y), h=x[1]) # sin(X)*sin(Y)
+        ```
+    """
+    if lam < 0:
+        raise ValueError(f"lam ({lam}) must be >= 0")
+    h = _h_tuple(h, f.ndim)
+    axes = tuple(range(f.ndim))
+    spec = np.fft.rfftn(f)
+    k2 = 0
+    for a in axes:
+        n = f.shape[a]
+        k = 2*np.pi * (np.fft.rfftfreq(n, d=h[a]) if a == f.ndim - 1 else np.fft.fftfreq(n, d=h[a]))
+        k2_a = (2 - 2*np.cos(k*h[a])) / h[a]**2 if discrete else k**2
+        bshape = [1] * f.ndim
+        bshape[a] = k.size
+        k2 = k2 + k2_a.reshape(bshape)
+    denom = -(k2 + lam)
+    if lam == 0:
+        denom.flat[0] = 1
+        spec.flat[0] = 0
+    spec /= denom
+    if out is None:
+        out = np.empty(f.shape, dtype=np.result_type(f, float))
+    out[...] = np.fft.irfftn(spec, s=f.shape)
+    return out
+
+# Multigrid
+# ==================================================
+
+def _operator_parts(u, bc):
+    """**private function**\n
+    (active view of u, x-neighbour sum, y-neighbour sum); \\
+    the active points are the interior for 'dirichlet', all points for 'neumann' (mirror ghost points)
+    """
+    if bc == 'dirichlet':
+        P, act = u, u[1:-1, 1:-1]
+    else:
+        P, act = np.pad(u, 1, mode='reflect'), u
+    return act, P[2:, 1:-1] + P[:-2, 1:-1], P[1:-1, 2:] + P[1:-1, :-2]
+
+def _active(a, bc):
+    """**private function**"""
+    return a[1:-1, 1:-1] if bc == 'dirichlet' else a
+
+def _residual(u, f, h, lam, bc):
+    """**private function**\n
+    r = f - A u, zero at Dirichlet boundaries
+    """
+    cx, cy = 1 / h[0]**2, 1 / h[1]**2
+    act, sx, sy = _operator_parts(u, bc)
+    r = np.zeros_like(u)
+    _active(r, bc)[...] = _active(f, bc) - (cx*sx + cy*sy - (2*cx + 2*cy + lam)*act)
+    return r
+
+def _smooth(u, f, h, lam, bc, masks, n_sweeps):
+    """**private function**\n
+    red-black Gauss-Seidel sweeps, in place
+    """
+    cx, cy = 1 / h[0]**2, 1 / h[1]**2
+    diag = 2*cx + 2*cy + lam
+    fa = _active(f, bc)
+    for _ in range(n_sweeps):
+        for mask in masks:
+            act, sx, sy = _operator_parts(u, bc)
+            act[mask] = ((cx*sx + cy*sy - fa) / diag)[mask]
+
+def _transfer_1d(n, nc):
+    """**private function**\n
+    linear interpolation from nc to n points spanning the same interval: (index, weight) per fine point
+    """
+    t   = np.arange(n) * ((nc - 1) / (n - 1))
+    idx = np.minimum(t.astype(int), nc - 2)
+    return idx, t - idx
+
+def _restrict(r, transfers):
+    """**private function**\n
+    transpose of `_prolong` normalised per coarse point (full weighting on nested grids)
+    """
+    for axis, (idx, w, nc) in enumerate(transfers):
+        r = np.moveaxis(r, axis, 0)
+        rc, wsum = np.zeros((nc,) + r.shape[1:]), np.zeros(nc)
+        wb = (1 - w)[:, None]
+        np.add.at(rc, idx, wb * r)
+        np.add.at(rc, idx + 1, w[:, None] * r)
+        np.add.at(wsum, idx, 1 - w)
+        np.add.at(wsum, idx + 1, w)
+        r = np.moveaxis(rc / wsum[:, None], 0, axis)
+    return r
+
+def _prolong(ec, transfers):
+    """**private function**\n
+    separable linear interpolation to the fine grid
+    """
+    for axis, (idx, w, _) in enumerate(transfers):
+        ec = np.moveaxis(ec, axis, 0)
+        ec = np.moveaxis(ec[idx] * (1 - w)[:, None] + ec[idx + 1] * w[:, None], 0, axis)
+    return ec
+
+def _dense_inverse(shape, h, lam, bc):
+    """**private function**\n
+    (pseudo-)inverse of the operator on the active points of the coarsest grid
+    """
+    def d2(n, h_a):
+        D = (np.diag(np.full(n, -2.)) + np.diag(np.ones(n-1), 1) + np.diag(np.ones(n-1), -1)) / h_a**2
+        if bc == 'neumann':
+            D[0, 1] = D[-1, -2] = 2 / h_a**2
+        return D
+    m = shape if bc == 'neumann' else (shape[0] - 2, shape[1] - 2)
+    A = np.kron(d2(m[0], h[0]), np.eye(m[1])) + np.kron(np.eye(m[0]), d2(m[1], h[1])) - lam*np.eye(m[0]*m[1])
+    return np.linalg.pinv(A) if (bc == 'neumann' and lam == 0) else np.linalg.inv(A)
+
+def _levels(shape, h, lam, bc, max_coarse):
+    """**private function**\n
+    grid hierarchy: list of (shape, h, red-black masks, transfers to the next level), 
+    the dense inverse of the coarsest level (None if it is too large)
+    """
+    levels = []
+    while True:
+        act = shape if bc == 'neumann' else (shape[0] - 2, shape[1] - 2)
+        I, J = np.indices(act)
+        red = (I + J) % 2 == 0
+        if act[0] * act[1] <= max_coarse or min(shape) < 5:
+            levels.append((shape, h, (red, ~red), None))
+            break
+        # n = 2m+1 -> m+1 points on the same nodes, otherwise the nearest non-nested grid
+        cshape = (shape[0]//2 + 1, shape[1]//2 + 1)
+        transfers = [(*_transfer_1d(n, nc), nc) for n, nc in zip(shape, cshape)]
+        levels.append((shape, h, (red, ~red), transfers))
+        h = (h[0] * (shape[0] - 1) / (cshape[0] - 1), h[1] * (shape[1] - 1) / (cshape[1] - 1))
+        shape = cshape
+    inv = _dense_inverse(shape, h, lam, bc) if act[0] * act[1] <= max_coarse else None
+    return levels, inv
+
+def _vcycle(u, f, lam, bc, levels, inv, level, nu):
+    """**private function**"""
+    shape, h, masks, transfers = levels[level]
+    if transfers is None:
+        if inv is None:
+            _smooth(u, f, h, lam, bc, masks, 50)
+        else:
+            _active(u, bc)[...] = (inv @ _active(f, bc).ravel()).reshape(_active(u, bc).shape)
+        return u
+    _smooth(u, f, h, lam, bc, masks, nu[0])
+    rc = _restrict(_residual(u, f, h, lam, bc), transfers)
+    ec = _vcycle(np.zeros_like(rc), rc, lam, bc, levels, inv, level + 1, nu)
+    e  = _prolong(ec, transfers)
+    if bc == 'dirichlet':
+        e[0], e[-1], e[:, 0], e[:, -1] = 0, 0, 0, 0
+    u += e
+    _smooth(u, f, h, lam, bc, masks, nu[1])
+    return u
+
+def poisson_mg(f: np.ndarray, h: float | tuple[float] = None, lam: float = 0., bc: str = 'dirichlet',
+               u0: np.ndarray = None, tol: float = 1e-8, max_cycles: int = 50, 
+               nu: tuple[int] = (2, 2), max_coarse: int = 256) -> tuple[np.ndarray, dict]:
+    """solve `laplacian(u) - lam * u = f` on a 2-d grid by geometric multigrid V-cycles, O(N)\n
+    2nd order 5-point operator on the grid points (boundaries included); \\
+    shapes of the form `(2^k * m + 1)` give nested grids, other shapes coarsen onto non-nested grids
+    Args:
+        f (np.ndarray): 2-d right hand side
+        h (float | tuple[float], optional): interval size, default is 1 for all dimensions
+        lam (float): Helmholtz coefficient (>= 0), 0 for Poisson
+        bc (str): 'dirichlet' (boundary values taken from u0) or 'neumann' (zero normal derivative); \\
+            for a Neumann Poisson problem the weighted mean of f is removed (compatibility) \\
+            and u is returned with zero weighted mean
+        u0 (np.ndarray, optional): initial guess and Dirichlet boundary values, default is 0
+        tol (float): stop when max|f - A u| <= tol * max|f|
+        max_cycles (int): maximum number of V-cycles
+        nu (tuple[int]): pre- and post-smoothing red-black Gauss-Seidel sweeps
+        max_coarse (int): solve the coarsest level directly when it has at most this many unknowns
+    Returns:
+        u (np.ndarray): solution
+        stats (dict): 'n_cycles', 'residual' (max|f - A u| / max|f|), 'n_levels'
+    Example:
+        ```python
+        x = np.linspace(0, 1, 257)
+        X, Y = np.meshgrid(x, x, indexing='ij')
+        u, stats = poisson_mg(-2*np.pi**2*np.sin(np.pi*X)*np.sin(np.pi*Y), h=x[1])
+        ```
+    """
+    if f.ndim != 2:
+        raise ValueError(f"f must be 2-d, got {f.ndim}-d")
+    if bc not in ('dirichlet', 'neumann'):
+        raise ValueError(f"bc must be 'dirichlet' or 'neumann', got '{bc}'")
+    if lam < 0:
+        raise ValueError(f"lam ({lam}) must be >= 0")
+    if min(f.shape) < 3:
+        raise ValueError(f"f.shape {f.shape} is too small")
+    h = _h_tuple(h, 2)
+    f = np.array(f, dtype=np.result_type(f, float))
+    u = np.zeros_like(f) if u0 is None else np.array(u0, dtype=f.dtype)
+    if u.shape != f.shape:
+        raise ValueError(f"u0.shape {u.shape} != {f.shape}")
+    singular = bc == 'neumann' and lam == 0
+    if singular: # trapezoid weights: the left null vector of the mirrored operator
+        w = np.outer(*(np.r_[0.5, np.ones(n - 2), 0.5] for n in f.shape))
+        f -= (w * f).sum() / w.sum()
+    levels, inv = _levels(f.shape, h, lam, bc, max_coarse)
+    scale = np.abs(_active(f, bc)).max() or 1.
+    stats = {'n_cycles': 0, 'residual': float(np.abs(_residual(u, f, h, lam, bc)).max() / scale), 'n_levels': len(levels)}
+    while stats['residual'] > tol and stats['n_cycles'] < max_cycles:
+        _vcycle(u, f, lam, bc, levels, inv, 0, nu)
+        if singular:
+            u -= (w * u).sum() / w.sum()
+        stats['n_cycles']  += 1
+        stats['residual'] = float(np.abs(_residual(u, f, h, lam, bc)).max() / scale)
+    return u, stats
+
+# Wind inversion
+# ==================================================
+
+def _invert(f, h, bc, kw):
+    """**private function**"""
+    if bc == 'periodic':
+        return poisson_fft(f, h, **kw)
+    u, _ = poisson_mg(f, h, bc=bc, **kw)
+    return u
+
+def streamfunction(vort: np.ndarray, h: float | tuple[float] = None, bc: str = 'periodic', **kw) -> np.ndarray:
+    """streamfunction psi from the vorticity (`curl` of (u, v)): `laplacian(psi) = vort`\n
+    the rotational wind is `u = -dpsi/dy, v = dpsi/dx` (axis 0 is x)
+    Args:
+        vort (np.ndarray): 2-d (n-d for 'periodic') relative vorticity
+        h (float | tuple[float], optional): interval size, default is 1 for all dimensions
+        bc (str): 'periodic' (`poisson_fft`), 'dirichlet' or 'neumann' (`poisson_mg`)
+        **kw: passed to the solver, e.g. `u0`, `tol` or `discrete`
+    Returns:
+        psi (np.ndarray)
+    """
+    return _invert(vort, h, bc, kw)
+
+def velocity_potential(div: np.ndarray, h: float | tuple[float] = None, bc: str = 'periodic', **kw) -> np.ndarray:
+    """velocity potential chi from the `divergence` of (u, v): `laplacian(chi) = div`\n
+    the divergent wind is `u = dchi/dx, v = dchi/dy`, see `streamfunction` for the arguments
+    """
+    return _invert(div, h, bc, kw)
+
+# ==================================================
+
+def main():
+    for n in (65, 129, 257, 513):
+        x = np.linspace(0, 1, n)
+        X, Y = np.meshgrid(x, x, indexing='ij')
+        t0 = perf_counter()
+        u, stats = poisson_mg(-2*np.pi**2*np.sin(np.pi*X)*np.sin(np.pi*Y), h=x[1])
+        print(f'{n:4d}^2: {stats}, err = {np.abs(u - np.sin(np.pi*X)*np.sin(np.pi*Y)).max():.2e}, '
+              f'{(perf_counter() - t0)*1000:.1f} ms')
+
+# ==================================================
+from time import perf_counter
+if __name__ == '__main__':
+    start_time = perf_counter()
+    main()
+    end_time = perf_counter()
+    print('\ntime :%.3f ms' %((end_time - start_time)*1000))
@@ -0,0 +1,238 @@
+# Compiled expression cache, LaTeX -> sympy -> numpy function
+# ==================================================
+import os
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+# sympy and latex2sympy2 are imported lazily (slow to import)
+# ==================================================
+__all__ = ['ExprCache', 'expr_cache', 'latex_to_sympy', 'lambdify_latex', 
+           'set_expr_cache_dir', 'expr_cache_info']
+# ==================================================
+
+def _sympy_class(name: str):
+    """**private function**\n
+    subclass of `sympy.Basic` defined in sympy by name, for the classes `srepr` uses \n
+    that are not exported at the top level (e.g. ExprCondPair), None if there is none
+    """
+    global _SYMPY_CLASSES
+    if _SYMPY_CLASSES is None or name not in _SYMPY_CLASSES: # sympy may have imported more modules
+        import sympy as sp
+        table, stack = {}, [sp.Basic]
+        while stack:
+            cls = stack.pop()
+            if (getattr(cls, '__module__', None) or '').startswith('sympy.'):
+                table.setdefault(cls.__name__, cls)
+            stack.extend(cls.__subclasses__())
+        _SYMPY_CLASSES = table
+    return _SYMPY_CLASSES.get(name)
+_SYMPY_CLASSES = None
+
+def _srepr_load(text: str):
+    """**private function**\n
+    rebuild a sympy expression from its `srepr` without evaluating the text: \n
+    only sympy singletons and calls of sympy classes (`Add`, `Symbol`, `Integer`, ...) with literal arguments are allowed, \n
+    None if the text is anything else
+    """
+    import sympy as sp
+    
+    def build(node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float, bool, type(None))):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+            return -build(node.operand)
+        if isinstance(node, ast.Name) and isinstance(obj := getattr(sp, node.id, None), sp.Basic):
+            return obj # singletons: true, pi, oo, I, ...
+        if isinstance(node, (ast.Tuple, ast.List)):
+            return tuple(build(e) for e in node.elts)
+        if isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Name):
+                func = getattr(sp, node.func.id, None)
+                if not (isinstance(func, type) and issubclass(func, sp.Basic)):
+                    func = _sympy_class(node.func.id)
+                if func is None:
+                    raise ValueError(f"{node.func.id} is not a sympy class")
+            else:
+                func = build(node.func) # e.g. Function('f')(x)
+                if not isinstance(func, sp.FunctionClass):
+                    raise ValueError("call of a non sympy function")
+            return func(*(build(a) for a in node.args), **{k.arg: build(k.value) for k in node.keywords})
+        raise ValueError(f"unexpected node {type(node).__name__}")
+    
+    try:
+        return build(ast.parse(text.strip(), mode='eval').body)
+    except (SyntaxError, ValueError, TypeError, AttributeError):
+        return None
+
+class ExprCache(object):
+    """cache of parsed LaTeX expressions and their lambdified numpy functions
+    Args:
+        maxsize (int): max number of entries kept in memory (LRU), for each of exprs and funcs
+        cache_dir (str, optional): directory of the on-disk store, parsed expressions are \\
+            saved there (as `sympy.srepr`) and survive restarts, default is no disk store. \\
+            it is created with mode 0o700, use a directory only you can write to
+    Note:
+        counters: `hits` / `misses` of the in-process LRU, one per public `sympify` / `lambdify` call \\
+        (a `lambdify` miss parses the expression without counting it again), `disk_hits` / `disk_writes` of the store. \\
+        stored expressions are rebuilt by `_srepr_load`, which only calls sympy classes \\
+        (no `eval` / `sympify` of the file content), a file it cannot rebuild is parsed again from the LaTeX
+    Example:
+        ```python
+        cache = ExprCache(cache_dir='~/.cache/qtool')
+        f = cache.lambdify('x^2 + \\\\sin(x)', ['x'])
+        cache.info() # {'hits': 0, 'misses': 1, 'disk_hits': 0, ...}
+        ```
+    """
+    def __init__(self, maxsize: int = 1024, cache_dir: None | str = None):
+        self.maxsize   = maxsize
+        self.cache_dir = cache_dir
+        self._exprs = OrderedDict() # latex -> sympy expr
+        self._funcs = OrderedDict() # (latex, varnames) -> function
+        self._lock  = threading.Lock()
+        self.hits = self.misses = self.disk_hits = self.disk_writes = 0
+        
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+    @cache_dir.setter
+    def cache_dir(self, value):
+        if value is not None:
+            value = os.path.expanduser(value)
+            os.makedirs(value, mode=0o700, exist_ok=True)
+        self._cache_dir = value
+    
+    def _get(self, table, key):
+        with self._lock:
+            if key in table:
+                table.move_to_end(key)
+                self.hits += 1
+                return table[key]
+            self.misses += 1
+            return None
+    
+    def _put(self, table, key, value):
+        with self._lock:
+            table[key] = value
+            table.move_to_end(key)
+            while len(table) > self.maxsize:
+                table.popitem(last=False)
+    
+    def _disk_path(self, latex: str):
+        return os.path.join(self._cache_dir, hashlib.sha1(latex.encode()).hexdigest() + '.srepr')
+    
+    def _disk_load(self, latex: str):
+        if self._cache_dir is None or not os.path.exists(path := self._disk_path(latex)):
+            return None
+        try:
+            with open(path) as f:
+                stored, srepr = f.read().split('\n', 1)
+        except (OSError, ValueError): # empty / truncated / undecodable file, parse again
+            return None
+        if stored != repr(latex): # hash collision
+            return None
+        if (expr := _srepr_load(srepr)) is None:
+            return None
+        self.disk_hits += 1
+        return expr
+    
+    def _disk_save(self, latex: str, expr):
+        if self._cache_dir is None:
+            return
+        import sympy as sp
+        path = self._disk_path(latex)
+        tmp  = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try: # written under a temporary name and renamed: readers never see a partial file
+            with open(tmp, 'w') as f:
+                f.write(repr(latex) + '\n' + sp.srepr(expr))
+            os.replace(tmp, path)
+        except OSError: # e.g. a full or read-only store, the expression stays in memory
+            return
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.disk_writes += 1
+    
+    def sympify(self, latex: str):
+        """LaTeX string -> sympy expression (`latex2sympy`), cached"""
+        if (expr := self._get(self._exprs, latex)) is not None:
+            return expr
+        return self._parse(latex)
+    
+    def _parse(self, latex: str):
+        with self._lock:
+            if (expr := self._exprs.get(latex)) is not None:
+                self._exprs.move_to_end(latex)
+                return expr
+        if (expr := self._disk_load(latex)) is None:
+            from latex2sympy2 import latex2sympy
+            expr = latex2sympy(latex)
+            self._disk_save(latex, expr)
+        self._put(self._exprs, latex, expr)
+        return expr
+    
+    def lambdify(self, latex: str, varnames: list[str] | str):
+        """LaTeX string -> numpy function of `varnames` (`sympy.lambdify`), cached"""
+        varnames = (varnames,) if isinstance(varnames, str) else tuple(varnames)
+        key = (latex, varnames)
+        if (func := self._get(self._funcs, key)) is not None:
+            return func
+        import sympy as sp
+        func = sp.lambdify(sp.symbols(varnames), self._parse(latex), modules='numpy')
+        self._put(self._funcs, key, func)
+        return func
+    
+    def info(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 
+                'disk_hits': self.disk_hits, 'disk_writes': self.disk_writes,
+                'exprs': len(self._exprs), 'funcs': len(self._funcs), 
+                'maxsize': self.maxsize, 'cache_dir': self._cache_dir}
+    
+    def clear(self):
+        """clear the in-process cache and counters, the on-disk store is kept"""
+        with self._lock:
+            self._exprs.clear()
+            self._funcs.clear()
+            self.hits = self.misses = self.disk_hits = self.disk_writes = 0
+
+# shared by `Piecewise_Func`, `ODE` and `ODE_System`, 
+# the on-disk store is enabled by the environment variable QTOOL_EXPR_CACHE
+expr_cache = ExprCache(cache_dir=os.environ.get('QTOOL_EXPR_CACHE'))
+
+def latex_to_sympy(latex: str):
+    """LaTeX string -> sympy expression, cached by `expr_cache`"""
+    return expr_cache.sympify(latex)
+
+def lambdify_latex(latex: str, varnames: list[str] | str):
+    """LaTeX string -> numpy function of `varnames`, cached by `expr_cache`"""
+    return expr_cache.lambdify(latex, varnames)
+
+def set_expr_cache_dir(cache_dir: None | str):
+    """enable (or disable with None) the on-disk store of `expr_cache`"""
+    expr_cache.cache_dir = cache_dir
+
+def expr_cache_info() -> dict:
+    """counters of `expr_cache`"""
+    return expr_cache.info()
+
+# ==================================================
+
+def main():
+    from time import perf_counter
+    import tempfile
+    
+    latex, cache_dir = '\\frac{x^2}{1 + e^{-x}} + \\sin(x)', tempfile.mkdtemp()
+    for name, cache in [('parse', ExprCache(cache_dir=cache_dir)), ('restart', ExprCache(cache_dir=cache_dir))]:
+        for i in range(2):
+            t0 = perf_counter()
+            cache.lambdify(latex, ['x'])
+            print(f'{name} call {i}: {(perf_counter() - t0)*1e3:.3f} ms')
+        print(cache.info())
+
+# ==================================================
+from time import perf_counter
+if __name__ == '__main__':
+    start_time = perf_counter()
+    main()
+    end_time = perf_counter()
+    print('\ntime :%.3f ms' %((end_time - start_time)*1000))
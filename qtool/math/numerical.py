@@ -1,59 +1,434 @@
 # _summary_
 # ==================================================
+import os
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+
 import numpy as np
+
+from .stencil import derivative, get_stencil, _grid_key, _sl
 # ==================================================
 
-__all__ = ['integrate', 'fdd_3pt_forward', 'fdd_3pt_backward', 'fdd_2pt_central',
-           'gradient', 'divergence', 'curl']
+__all__ = ['integrate', 'cumulative_integrate', 'fdd_3pt_forward', 'fdd_3pt_backward', 'fdd_2pt_central',
+           'StreamingDerivative', 'DerivativeCache', 'gradient', 'divergence', 'curl', 
+           'laplacian', 'vorticity', 'advection', 'deformation']
+
+# `np.trapz` is removed in NumPy 2.x
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz
 
 def integrate(f, a, b, n=1000):
-    """Integrate f(x) from a to b by `np.trapz`."""
+    """Integrate f(x) from a to b by the trapezoid rule on n uniform intervals, \
+    see `quadrature.quad` for adaptive integration with error control."""
     x = np.linspace(a, b, n+1)
     y = f(x)
-    return np.trapz(y, x)
+    return _trapezoid(y, x)
 
 # ==================================================
 # Finite Difference from data (fdd)
-def fdd_3pt_forward(Y, h, axis=0):
-    """finite difference from data, 3 points forward"""
+def _fdd_out(Y, axis, out, n_drop=2):
+    """**private function**\n
+    output buffer of fdd, shape of Y with `n_drop` less elements on axis
+    """
     if Y.shape[axis] < 3: raise ValueError("Y must have at least 3 elements")
-    if axis == 0:
-        return (-3*Y[:-2] + 4*Y[1:-1] - Y[2:]) / (2*h)
-    else:
-        idxer1, idxer2, idxer3 = [slice(None)] * Y.ndim, [slice(None)] * Y.ndim, [slice(None)] * Y.ndim
-        idxer1[axis] = slice(None, -2)
-        idxer2[axis] = slice(1, -1)
-        idxer3[axis] = slice(2, None)
-        return (-3*Y[tuple(idxer1)] + 4*Y[tuple(idxer2)] - Y[tuple(idxer3)]) / (2*h)
+    shape = list(Y.shape)
+    shape[axis] -= n_drop
+    if out is None:
+        return np.empty(shape, dtype=np.result_type(Y, float))
+    if out.shape != tuple(shape):
+        raise ValueError(f"out.shape {out.shape} != {tuple(shape)}")
+    return out
+
+def fdd_3pt_forward(Y, h, axis=0, out=None):
+    """finite difference from data, 3 points forward"""
+    out = _fdd_out(Y, axis, out)
+    y0, y1, y2 = (Y[_sl(Y.ndim, axis, s)] for s in (slice(None, -2), slice(1, -1), slice(2, None)))
+    np.subtract(y1, y0, out=out) # (-3*y0 + 4*y1 - y2) / (2h) without temporaries
+    out *= 4
+    out += y0
+    out -= y2
+    out *= 1 / (2*h)
+    return out
 
-def fdd_3pt_backward(Y, h, axis=0):
+def fdd_3pt_backward(Y, h, axis=0, out=None):
     """finite difference from data, 3 points backward"""
-    if Y.shape[axis] < 3: raise ValueError("Y must have at least 3 elements")
-    if axis == 0:
-        return (3*Y[2:] - 4*Y[1:-1] + Y[:-2]) / (2*h)
-    else:
-        idxer1, idxer2, idxer3 = [slice(None)] * Y.ndim, [slice(None)] * Y.ndim, [slice(None)] * Y.ndim
-        idxer1[axis] = slice(2, None)
-        idxer2[axis] = slice(1, -1)
-        idxer3[axis] = slice(None, -2)
-        return (3*Y[tuple(idxer1)] - 4*Y[tuple(idxer2)] + Y[tuple(idxer3)]) / (2*h)
+    out = _fdd_out(Y, axis, out)
+    y0, y1, y2 = (Y[_sl(Y.ndim, axis, s)] for s in (slice(None, -2), slice(1, -1), slice(2, None)))
+    np.subtract(y2, y1, out=out) # (3*y2 - 4*y1 + y0) / (2h) without temporaries
+    out *= 4
+    out -= y2
+    out += y0
+    out *= 1 / (2*h)
+    return out
     
-def fdd_2pt_central(Y, h, axis=0):
+def fdd_2pt_central(Y, h, axis=0, out=None):
     """finite difference from data, 2 points central"""
-    if Y.shape[axis] < 3: raise ValueError("Y must have at least 3 elements")
-    if axis == 0:
-        return (Y[2:] - Y[:-2]) / (2*h)
+    out = _fdd_out(Y, axis, out)
+    np.subtract(Y[_sl(Y.ndim, axis, slice(2, None))], Y[_sl(Y.ndim, axis, slice(None, -2))], out=out)
+    out *= 1 / (2*h)
+    return out
+
+def _fdd_accumulate(Y, axis, out, sign=1, first=False, lo=0, hi=None):
+    """**private function**\n
+    out (+)= sign * 2h * dY/dx_axis in place, for the points lo:hi of the axis in one pass: \n
+    2 pts central inside, 3 pts forward / backward at the boundaries (same as `gradient`)\n
+    out holds the points lo:hi only, Y holds the whole axis (lo:hi with a halo of 1 is read)
+    """
+    if (n := Y.shape[axis]) < 3: raise ValueError("Y must have at least 3 elements")
+    hi = n if hi is None else hi
+    nd = Y.ndim
+    i0, i1 = max(lo, 1), min(hi, n-1) # interior points
+    if i1 > i0:
+        o_in = out[_sl(nd, axis, slice(i0-lo, i1-lo))]
+        a, b = Y[_sl(nd, axis, slice(i0+1, i1+1))], Y[_sl(nd, axis, slice(i0-1, i1-1))]
+        if sign < 0: a, b = b, a
+        if first:
+            np.subtract(a, b, out=o_in)
+        else:
+            o_in += a
+            o_in -= b
+    # boundary planes, temporaries are 1 plane only
+    if lo == 0:
+        y0, y1, y2 = (Y[_sl(nd, axis, slice(i, i+1))] for i in (0, 1, 2))
+        o_lo, d = out[_sl(nd, axis, slice(0, 1))], sign * (4*y1 - 3*y0 - y2)
+        if first: o_lo[...] = d 
+        else:     o_lo += d
+    if hi == n:
+        yl, yk, yj = (Y[_sl(nd, axis, slice(i, i+1))] for i in (n-1, n-2, n-3))
+        o_hi, d = out[_sl(nd, axis, slice(hi-1-lo, hi-lo))], sign * (3*yl - 4*yk + yj)
+        if first: o_hi[...] = d
+        else:     o_hi += d
+    return out
+
+def _fused_sum(terms, h, out, tile=None):
+    """**private function**\n
+    out = sum(sign * dY/dx_axis for Y, axis, sign in terms) in place, without full size temporaries \n
+    the partial sum is kept in units of the current 2h and rescaled when h changes \n
+    tile (t, lo, hi): out holds the points lo:hi of axis t only
+    """
+    prev = None
+    for k, (Y, axis, sign) in enumerate(terms):
+        if k > 0 and h[axis] != h[prev]:
+            out *= h[axis] / h[prev]
+        if tile is None:
+            _fdd_accumulate(Y, axis, out, sign, first=(k == 0))
+        elif axis == tile[0]: # along the tiled axis, read a halo
+            _fdd_accumulate(Y, axis, out, sign, first=(k == 0), lo=tile[1], hi=tile[2])
+        else:
+            _fdd_accumulate(Y[_sl(Y.ndim, tile[0], slice(tile[1], tile[2]))], axis, out, sign, first=(k == 0))
+        prev = axis
+    out *= 1 / (2*h[prev])
+    return out
+
+def _fused_sum_tiled(terms, h, out, n_workers=None, executor=None):
+    """**private function**\n
+    `_fused_sum` on tiles of out run by a thread pool (numpy releases the GIL) \n
+    tiles are cut along the outermost axis that is not differentiated, \n
+    or along a differentiated axis with a halo of 1 if there is none
+    """
+    if executor is None and (n_workers is None or n_workers <= 1):
+        return _fused_sum(terms, h, out)
+    n_tiles = n_workers if n_workers is not None and n_workers > 1 else os.cpu_count()
+    axes = {axis for _, axis, _ in terms}
+    cand = [a for a in range(out.ndim) if a not in axes] or list(range(out.ndim))
+    t = next((a for a in cand if out.shape[a] >= n_tiles), max(cand, key=lambda a: out.shape[a]))
+    bounds = np.unique(np.linspace(0, out.shape[t], min(n_tiles, out.shape[t]) + 1).astype(int))
+    
+    def job(lo, hi):
+        _fused_sum(terms, h, out[_sl(out.ndim, t, slice(lo, hi))], tile=(t, lo, hi))
+    if executor is not None:
+        list(executor.map(job, bounds[:-1], bounds[1:]))
+    else:
+        with ThreadPoolExecutor(n_workers) as pool:
+            list(pool.map(job, bounds[:-1], bounds[1:]))
+    return out
+
+class StreamingDerivative(object):
+    """time derivative of a stream of slices, with a ring buffer of the last 3 slices\n
+    each `push` copies the new slice into the buffer (history is never moved or re-stacked) \\
+    and emits the 3 points backward difference at the new time and the 2 points central difference \\
+    at the previous time, the same formulas as `fdd_3pt_backward` and `fdd_2pt_central`.
+    Args:
+        h (float): interval of the stream (e.g. the model time step)
+    Example:
+        ```python
+        ddt = StreamingDerivative(h=dt)
+        for T in model_output:
+            dT_now, dT_prev = ddt.push(T) # None until 3 slices have been pushed
+        ```
+    """
+    def __init__(self, h: float):
+        self.h = h
+        self.reset()
+
+    def reset(self):
+        """drop the buffered slices (the buffer memory is kept)"""
+        self.n_pushed = 0
+
+    @property
+    def nbytes(self) -> int:
+        """memory of the ring buffer"""
+        return 0 if getattr(self, '_buf', None) is None else self._buf.nbytes
+
+    def _slices(self):
+        """**private function**\n
+        (y0, y1, y2) oldest to newest
+        """
+        i = self.n_pushed
+        return self._buf[i % 3], self._buf[(i + 1) % 3], self._buf[(i + 2) % 3]
+
+    def push(self, Y: np.ndarray, out: tuple[np.ndarray] = (None, None)) -> tuple[np.ndarray, np.ndarray]:
+        """add the newest slice
+        Args:
+            Y (np.ndarray): slice, same shape at every push
+            out (tuple[np.ndarray], optional): buffers for the (backward, central) results
+        Returns:
+            backward (np.ndarray): dY/dt at the newest slice, None before the 3rd push
+            central (np.ndarray): dY/dt at the previous slice, None before the 3rd push
+        """
+        Y = np.asarray(Y)
+        buf = getattr(self, '_buf', None)
+        if buf is None or buf.shape[1:] != Y.shape:
+            if self.n_pushed:
+                raise ValueError(f"Y.shape {Y.shape} != {buf.shape[1:]} of the buffered slices")
+            self._buf = buf = np.empty((3,) + Y.shape, dtype=np.result_type(Y, float))
+        buf[self.n_pushed % 3] = Y
+        self.n_pushed += 1
+        if self.n_pushed < 3:
+            return None, None
+        return self.backward(out[0]), self.central(out[1])
+
+    def _out(self, out):
+        """**private function**"""
+        if out is None:
+            return np.empty_like(self._buf[0])
+        if out.shape != self._buf.shape[1:]:
+            raise ValueError(f"out.shape {out.shape} != {self._buf.shape[1:]}")
+        return out
+
+    def backward(self, out: np.ndarray = None) -> np.ndarray:
+        """3 points backward difference at the newest slice"""
+        if self.n_pushed < 3: raise ValueError("at least 3 slices must be pushed")
+        y0, y1, y2 = self._slices()
+        out = self._out(out)
+        np.subtract(y2, y1, out=out) # (3*y2 - 4*y1 + y0) / (2h)
+        out *= 4
+        out -= y2
+        out += y0
+        out *= 1 / (2*self.h)
+        return out
+
+    def central(self, out: np.ndarray = None) -> np.ndarray:
+        """2 points central difference at the previous slice"""
+        if self.n_pushed < 3: raise ValueError("at least 3 slices must be pushed")
+        y0, _, y2 = self._slices()
+        out = self._out(out)
+        np.subtract(y2, y0, out=out)
+        out *= 1 / (2*self.h)
+        return out
+
+# ==================================================
+# Cumulative integration from data
+def cumulative_integrate(Y: np.ndarray, x: np.ndarray = None, h: float = 1., axis: int = 0, 
+                         method: str = 'trapezoid', initial: float | np.ndarray = 0., 
+                         out: np.ndarray = None) -> np.ndarray:
+    """cumulative integral of Y along `axis` on a (non-uniform) coordinate, all columns at once\n
+    Args:
+        Y (np.ndarray): n-d data
+        x (np.ndarray, optional): coordinate, 1-d with `Y.shape[axis]` points or the shape of Y \\
+            (e.g. pressure of every column), default is uniform with interval h
+        h (float): interval size when x is None
+        axis (int): axis to integrate along
+        method (str): 'trapezoid' (2nd order) or 'simpson' (piecewise quadratic, \\
+            each interior interval averages the two parabolas through its neighbours, 4th order on uniform grids)
+        initial (float | np.ndarray): value at the first point, broadcast against a slice of Y
+        out (np.ndarray, optional): output buffer with the shape of Y
+    Returns:
+        res (np.ndarray): shape of Y, `res[0] = initial`, `res[i] = initial + integral from x[0] to x[i]`
+    Example:
+        ```python
+        # hydrostatic thickness of every column: z = -Rd/g * integral of T d(ln p)
+        z = -287 / 9.81 * cumulative_integrate(T, np.log(p), axis=0)
+        ```
+    """
+    axis = axis % Y.ndim
+    n = Y.shape[axis]
+    if n < 2:
+        raise ValueError("Y must have at least 2 elements along axis")
+    if method not in ('trapezoid', 'simpson'):
+        raise ValueError(f"method must be 'trapezoid' or 'simpson', got '{method}'")
+    if x is None:
+        dx = h
+    else:
+        x = np.asarray(x)
+        if x.ndim == 1:
+            if x.size != n:
+                raise ValueError(f"len(x) ({x.size}) != Y.shape[axis] ({n})")
+            x = x.reshape([-1 if i == axis else 1 for i in range(Y.ndim)])
+        elif x.shape != Y.shape:
+            raise ValueError(f"x.shape {x.shape} must be ({n},) or Y.shape {Y.shape}")
+        dx = np.diff(x, axis=axis)
+    if out is None:
+        out = np.empty(Y.shape, dtype=np.result_type(Y, float))
+    elif out.shape != Y.shape:
+        raise ValueError(f"out.shape {out.shape} != {Y.shape}")
+    sl = lambda s: _sl(Y.ndim, axis, s)
+    seg = out[sl(slice(1, None))] # interval integrals, accumulated in place
+    if method == 'trapezoid' or n < 3:
+        np.add(Y[sl(slice(None, -1))], Y[sl(slice(1, None))], out=seg)
+        seg *= dx
+        seg *= 0.5
+    else:
+        y0, y1, y2 = Y[sl(slice(None, -2))], Y[sl(slice(1, -1))], Y[sl(slice(2, None))]
+        if np.ndim(dx) == 0:
+            h0 = h1 = dx
+        else:
+            h0, h1 = dx[sl(slice(None, -1))], dx[sl(slice(1, None))]
+        hs = h0 + h1
+        # parabola through (i, i+1, i+2) over [x_i, x_i+1] and over [x_i+1, x_i+2]
+        fwd = (h0*(2*h0 + 3*h1)/(6*hs))*y0 + (h0*(h0 + 3*h1)/(6*h1))*y1 - (h0**3/(6*h1*hs))*y2
+        bwd = -(h1**3/(6*h0*hs))*y0 + (h1*(3*h0 + h1)/(6*h0))*y1 + (h1*(3*h0 + 2*h1)/(6*hs))*y2
+        seg[sl(slice(None, 1))]  = fwd[sl(slice(None, 1))]
+        seg[sl(slice(-1, None))] = bwd[sl(slice(-1, None))]
+        np.add(fwd[sl(slice(1, None))], bwd[sl(slice(None, -1))], out=seg[sl(slice(1, -1))])
+        seg[sl(slice(1, -1))] *= 0.5
+    np.cumsum(seg, axis=axis, out=seg)
+    seg += np.expand_dims(initial, axis) if np.ndim(initial) else initial
+    out[sl(slice(None, 1))] = np.expand_dims(initial, axis) if np.ndim(initial) else initial
+    return out
+
+# ==================================================
+# Derivative cache
+class DerivativeCache(object):
+    """memoized partial derivatives dF/dx_axis, shared by the vector calculus operators
+    Args:
+        max_bytes (int, optional): memory bound of the cached derivatives, least recently used \
+            ones are evicted first, default is unbounded
+    Note:
+        entries are keyed by the identity of the array (kept alive by the cache), the axis, h, \
+        the accuracy and the derivative order (first derivatives of `gradient` etc., second ones of `laplacian`). \
+        the cached derivatives are read-only, and an array must not be modified in place while \
+        it is cached (or call `invalidate`). pass the same array objects (not new views) to hit.
+    Example:
+        ```python
+        cache = DerivativeCache(max_bytes=2**30)
+        zeta  = vorticity(u, v, h=dx, cache=cache)    # dv/dx, du/dy
+        delta = divergence(u, v, h=dx, cache=cache)   # du/dx, dv/dy
+        D1, D2 = deformation(u, v, h=dx, cache=cache) # all cached
+        cache.info() # {'hits': 4, 'misses': 4, ...}
+        ```
+    """
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes
+        self._table = OrderedDict() # (id, axis, h) -> (arr, dF/dx)
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+        
+    def partial(self, arr: np.ndarray, axis: int, h: float | np.ndarray = 1, 
+                n_workers: int = None, executor: Executor = None, accuracy: int = 2, 
+                deriv: int = 1) -> np.ndarray:
+        """dF/dx_axis of arr (read-only), same stencils as `gradient`, or d2F/dx_axis^2 for deriv=2 \
+        (the stencils of `laplacian`), computed by `n_workers` threads (or `executor`) on a miss"""
+        if deriv not in (1, 2):
+            raise ValueError(f"deriv must be 1 or 2, got {deriv}")
+        key = (id(arr), axis, float(h) if np.ndim(h) == 0 else _grid_key(h), accuracy, deriv)
+        if (entry := self._table.get(key)) is not None and entry[0] is arr:
+            self._table.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        res = (_deriv if deriv == 1 else _deriv2)(arr, axis, h, accuracy, n_workers, executor)
+        res.flags.writeable = False
+        self._table[key] = (arr, res)
+        self.nbytes += res.nbytes
+        while self.max_bytes is not None and self.nbytes > self.max_bytes and len(self._table) > 1:
+            self.nbytes -= self._table.popitem(last=False)[1][1].nbytes
+            self.evictions += 1
+        return res
+    
+    def invalidate(self, arr: np.ndarray):
+        """drop all derivatives of arr"""
+        for key in [k for k, (a, _) in self._table.items() if a is arr]:
+            self.nbytes -= self._table.pop(key)[1].nbytes
+    
+    def clear(self):
+        self._table.clear()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+    
+    def info(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._table), 'nbytes': self.nbytes, 'max_bytes': self.max_bytes}
+
+def _deriv(arr, axis, h_axis, accuracy=2, n_workers=None, executor=None):
+    """**private function**\n
+    dF/dx_axis in a new array, fused 2nd order path for scalar h, else the stencil engine \n
+    (h_axis: interval or 1-d coordinates)
+    """
+    if np.ndim(h_axis) == 0:
+        if accuracy == 2:
+            return _fused_sum_tiled([(arr, axis, 1)], {axis: h_axis}, _new_like(arr), n_workers, executor)
+        return derivative(arr, h=h_axis, axis=axis, accuracy=accuracy)
+    return derivative(arr, x=h_axis, axis=axis, accuracy=accuracy)
+
+def _stencil2(n, h_axis, accuracy=2):
+    """**private function**\n
+    second derivative stencil of an axis with n points (h_axis: interval or 1-d coordinates)
+    """
+    if np.ndim(h_axis):
+        return get_stencil(x=h_axis, deriv=2, accuracy=accuracy)
+    return get_stencil(n=n, h=h_axis, deriv=2, accuracy=accuracy)
+
+def _deriv2(arr, axis, h_axis, accuracy=2, n_workers=None, executor=None):
+    """**private function**\n
+    d2F/dx_axis^2 in a new array, tiled along the largest other axis when threaded
+    """
+    st, out = _stencil2(arr.shape[axis], h_axis, accuracy), _new_like(arr)
+    if arr.ndim == 1 or (executor is None and (n_workers is None or n_workers <= 1)):
+        return st.apply(arr, axis, out=out)
+    n_tiles = n_workers if n_workers is not None and n_workers > 1 else os.cpu_count()
+    t = max((a for a in range(arr.ndim) if a != axis), key=lambda a: arr.shape[a])
+    bounds = np.unique(np.linspace(0, arr.shape[t], min(n_tiles, arr.shape[t]) + 1).astype(int))
+    
+    def job(lo, hi):
+        sl = _sl(arr.ndim, t, slice(lo, hi))
+        st.apply(arr[sl], axis, out=out[sl])
+    if executor is not None:
+        list(executor.map(job, bounds[:-1], bounds[1:]))
     else:
-        idxer1, idxer2 = [slice(None)] * Y.ndim, [slice(None)] * Y.ndim
-        idxer1[axis] = slice(2, None)
-        idxer2[axis] = slice(None, -2)
-        return (Y[tuple(idxer1)] - Y[tuple(idxer2)]) / (2*h)
+        with ThreadPoolExecutor(n_workers) as pool:
+            list(pool.map(job, bounds[:-1], bounds[1:]))
+    return out
+
+def _partial(arr, axis, h, cache=None, n_workers=None, executor=None, accuracy=2):
+    """**private function**\n
+    dF/dx_axis, from `cache` if given
+    """
+    if cache is None:
+        return _deriv(arr, axis, h[axis], accuracy, n_workers, executor)
+    return cache.partial(arr, axis, h[axis], n_workers, executor, accuracy)
+
+def _sum_terms(terms, h, out, cache=None, n_workers=None, executor=None, accuracy=2):
+    """**private function**\n
+    sum(sign * dY/dx_axis for Y, axis, sign in terms) into out, \n
+    fused (2nd order, scalar h) or from `cache` / the stencil engine
+    """
+    if cache is None and accuracy == 2 and all(np.ndim(h[axis]) == 0 for _, axis, _ in terms):
+        return _fused_sum_tiled(terms, h, out, n_workers, executor)
+    for k, (Y, axis, sign) in enumerate(terms):
+        d = _partial(Y, axis, h, cache, n_workers, executor, accuracy)
+        if k == 0:
+            np.copyto(out, d) if sign > 0 else np.negative(d, out=out)
+        else:
+            np.add(out, d, out=out) if sign > 0 else np.subtract(out, d, out=out)
+    return out
 
 # ==================================================
 # Vector Calculus
 def _args_check_VectorCalculus(*arrs, h=None):
     """**private function**\n
     for `gradient`, `divergence`, `curl`\n
+    Returns:
+        Ndim (int), h (tuple[float]) with one interval per dimension
     """
     if len(arrs) != (Ndim := arrs[0].ndim):
         raise ValueError(f"len(arrs) ({len(arrs)}) must be equal to the ndim of the arrays ({Ndim})")
@@ -65,15 +440,38 @@ def _args_check_VectorCalculus(*arrs, h=None):
         h = (h,) * Ndim
     elif len(h) != Ndim:
         raise ValueError("len(h) must be equal to the ndim of the array")
-    return Ndim
+    for i, h_i in enumerate(h): # 1-d coordinates of a non-uniform axis
+        if np.ndim(h_i) != 0 and (np.ndim(h_i) != 1 or len(h_i) != arrs[0].shape[i]):
+            raise ValueError(f"h[{i}] must be a number or 1-d coordinates with {arrs[0].shape[i]} elements")
+    return Ndim, tuple(h)
+
+def _new_like(arr, out=None):
+    """**private function**\n
+    float output buffer with the shape of arr
+    """
+    if out is None:
+        return np.empty(arr.shape, dtype=np.result_type(arr, float))
+    if out.shape != arr.shape:
+        raise ValueError(f"out.shape {out.shape} != {arr.shape}")
+    return out
 
-def gradient(*arrs: np.ndarray, h: float | tuple[float] = None) -> list[np.ndarray]:
+def gradient(*arrs: np.ndarray, h: float | tuple[float] = None, 
+             out: list[np.ndarray] = None, cache: DerivativeCache = None, 
+             n_workers: int = None, executor: Executor = None, accuracy: int = 2) -> list[np.ndarray]:
     """gradient of n-d arrays using finite difference\n
     using 3 pts forward and backward and 2 pts central\n 
     truncation error: `O(h^2)`\n
     Args:
         arrs (*np.ndarray): n-d arrays
-        h (float | tuple[float], optional): interval size, default is 1 for all dimensions
+        h (float | tuple[float | np.ndarray], optional): interval size, default is 1 for all dimensions, \
+            or 1-d coordinates of an axis for non-uniform grids (see `stencil.derivative`)
+        out (list[np.ndarray], optional): buffers for the result, written in place
+        cache (DerivativeCache, optional): memoized partial derivatives, \
+            without `out` the read-only cached arrays are returned
+        n_workers (int, optional): number of threads, the arrays are cut into tiles
+        executor (Executor, optional): run the tiles on this executor (e.g. a shared ThreadPoolExecutor)
+        accuracy (int): order of the truncation error, 2 uses the stencils above, \
+            others use `stencil.derivative` (`n_workers` applies to the 2nd order path only)
     Returns:
         res (list[np.ndarray]): divergence of n-d arrays with same shape as any arr in arrs
     Example:
@@ -86,59 +484,192 @@ def gradient(*arrs: np.ndarray, h: float | tuple[float] = None) -> list[np.ndarr
         gradF = gradient(Fx, Fy, Fz, h=x[1]-x[0])
         ```
     """
-    Ndim = _args_check_VectorCalculus(*arrs, h=h)
+    Ndim, h = _args_check_VectorCalculus(*arrs, h=h)
     
-    res = [np.zeros_like(arr) for arr in arrs]
-    idxer = [slice(None)] * Ndim
+    if cache is not None and out is None:
+        return [cache.partial(arr, i, h[i], n_workers, executor, accuracy) for i, arr in enumerate(arrs)]
+    res = [_new_like(arr, None if out is None else out[i]) for i, arr in enumerate(arrs)]
     for i, arr in enumerate(arrs): # compute gradient of each dim
-        idxer[i] = slice(1, -1)
-        res[i][tuple(idxer)] = fdd_2pt_central(arr, h[i], axis=i)
-        idxer[i] = slice(None, 1)
-        res[i][tuple(idxer)] = fdd_3pt_forward(arr.take(range(0, 3), axis=i), h[i], axis=i)
-        idxer[i] = slice(-1, None)
-        res[i][tuple(idxer)] = fdd_3pt_backward(arr.take(range(-3, 0), axis=i), h[i], axis=i)
-        idxer[i] = slice(None) # reset index
+        _sum_terms([(arr, i, 1)], h, res[i], cache, n_workers, executor, accuracy)
     return res
 
-def divergence(*arrs: np.ndarray, h: float | tuple[float] = None) -> np.ndarray:
+def divergence(*arrs: np.ndarray, h: float | tuple[float] = None, 
+               out: np.ndarray = None, cache: DerivativeCache = None, 
+               n_workers: int = None, executor: Executor = None, accuracy: int = 2) -> np.ndarray:
     """divergence of n-d arrays using finite difference\n
     using 3 pts forward and backward and 2 pts central\n 
     truncation error: `O(h^2)`\n
     Args:
         arrs (*np.ndarray): n-d arrays
-        h (float | tuple[float], optional): interval size, default is 1 for all dimensions
+        h (float | tuple[float | np.ndarray], optional): interval size, default is 1 for all dimensions, \
+            or 1-d coordinates of an axis for non-uniform grids (see `stencil.derivative`)
+        out (np.ndarray, optional): buffer for the result, accumulated in place
+        cache (DerivativeCache, optional): memoized partial derivatives
+        n_workers (int, optional): number of threads, the arrays are cut into tiles
+        executor (Executor, optional): run the tiles on this executor (e.g. a shared ThreadPoolExecutor)
+        accuracy (int): order of the truncation error, 2 uses the stencils above, \
+            others use `stencil.derivative` (`n_workers` applies to the 2nd order path only)
     Returns:
         res (np.ndarray): divergence of n-d arrays with same shape as any arr in arrs
     See Also
     ---
-        `gradient` (used to calc. the partial derivatives)
+        `gradient` (same stencils)
     """    
-    return sum(gradient(*arrs, h=h))
+    Ndim, h = _args_check_VectorCalculus(*arrs, h=h)
+    return _sum_terms([(arr, i, 1) for i, arr in enumerate(arrs)], h, _new_like(arrs[0], out), 
+                      cache, n_workers, executor, accuracy)
 
-def curl(*arrs: np.ndarray, h: float | tuple[float] = None) -> list[np.ndarray]:
+def curl(*arrs: np.ndarray, h: float | tuple[float] = None, 
+         out: np.ndarray | list[np.ndarray] = None, cache: DerivativeCache = None, 
+         n_workers: int = None, executor: Executor = None, accuracy: int = 2) -> np.ndarray | list[np.ndarray]:
     """curl of 2 or 3-d arrays using finite difference\n
     truncation error: `O(h^2)`\n
     Args:
         arrs (*np.ndarray): n-d arrays
-        h (float | tuple[float], optional): interval size, default is 1 for all dimensions
+        h (float | tuple[float | np.ndarray], optional): interval size, default is 1 for all dimensions, \
+            or 1-d coordinates of an axis for non-uniform grids (see `stencil.derivative`)
+        out (np.ndarray | list[np.ndarray], optional): buffer(s) for the result, written in place
+        cache (DerivativeCache, optional): memoized partial derivatives
+        n_workers (int, optional): number of threads, the arrays are cut into tiles
+        executor (Executor, optional): run the tiles on this executor (e.g. a shared ThreadPoolExecutor)
+        accuracy (int): order of the truncation error, 2 uses the stencils above, \
+            others use `stencil.derivative` (`n_workers` applies to the 2nd order path only)
     Returns:
-        res (list[np.ndarray]): curl of n-d arrays with same shape as any arr in arrs
+        res (np.ndarray | list[np.ndarray]): curl of n-d arrays with same shape as any arr in arrs, \
+            a single array (z component) for 2-d
     See Also
     ---
-        `gradient` (used to calc. the partial derivatives)
+        `gradient` (same stencils)
     """
-    Ndim = _args_check_VectorCalculus(*arrs, h=h)
+    Ndim, h = _args_check_VectorCalculus(*arrs, h=h)
     
     if Ndim == 2:
-        dFy_dx, dFx_dy = gradient(arrs[0], arrs[1], h=h)
-        return dFy_dx - dFx_dy
+        return _sum_terms(_curl_terms(arrs)[0], h, _new_like(arrs[0], out), cache, n_workers, executor, accuracy)
     elif Ndim == 3:
-        grad_left = gradient(arrs[1], arrs[2], arrs[0], h=h)
-        grad_right = gradient(arrs[2], arrs[0], arrs[1], h=h)
-        return [grad_left[1] - grad_right[2], grad_right[2] - grad_left[0], grad_left[0] - grad_right[1]]
+        res = [_new_like(arrs[0], None if out is None else out[i]) for i in range(3)]
+        for terms, res_i in zip(_curl_terms(arrs), res):
+            _sum_terms(terms, h, res_i, cache, n_workers, executor, accuracy)
+        return res
     else:
         raise ValueError("curl is only for 2 or 3-d arrays")
 
+def _curl_terms(arrs):
+    """**private function**\n
+    (array, axis, sign) terms of each curl component
+    """
+    if len(arrs) == 2:
+        return [[(arrs[1], 0, 1), (arrs[0], 1, -1)]]
+    F0, F1, F2 = arrs
+    return [[(F2, 1, 1), (F1, 2, -1)], 
+            [(F0, 2, 1), (F2, 0, -1)], 
+            [(F1, 0, 1), (F0, 1, -1)]]
+
+def vorticity(*arrs: np.ndarray, h: float | tuple[float] = None, 
+              out: np.ndarray | list[np.ndarray] = None, cache: DerivativeCache = None, 
+              n_workers: int = None, executor: Executor = None, accuracy: int = 2):
+    """vorticity of 2 or 3-d winds, same as `curl`"""
+    return curl(*arrs, h=h, out=out, cache=cache, n_workers=n_workers, executor=executor, accuracy=accuracy)
+
+def laplacian(arr: np.ndarray, h: float | tuple[float] = None, 
+              out: np.ndarray = None, cache: DerivativeCache = None, 
+              n_workers: int = None, executor: Executor = None, accuracy: int = 2) -> np.ndarray:
+    """laplacian of a n-d array, sum of d2F/dx_i^2 by the compact second derivative stencils \
+    of `stencil.get_stencil(deriv=2)` (3 points per axis `(F[i-1] - 2F[i] + F[i+1]) / h^2` for accuracy 2, \
+    one-sided stencils of the same accuracy at the boundaries)\n
+    truncation error: `O(h^accuracy)`
+    Args:
+        arr (np.ndarray): n-d array
+        h (float | tuple[float | np.ndarray], optional): interval size, default is 1 for all dimensions, \
+            or 1-d coordinates of an axis for non-uniform grids (see `stencil.derivative`)
+        out (np.ndarray, optional): buffer for the result
+        cache (DerivativeCache, optional): memoized second derivatives d2F/dx_i^2 \
+            (`DerivativeCache.partial(deriv=2)`), shared by the calls with the same cache
+        n_workers (int, optional): number of threads, the arrays are cut into tiles
+        executor (Executor, optional): run the tiles on this executor (e.g. a shared ThreadPoolExecutor)
+        accuracy (int): order of the truncation error
+    """
+    Ndim, h = _args_check_VectorCalculus(*(arr,) * arr.ndim, h=h)
+    out = _new_like(arr, out)
+    if cache is not None:
+        d2 = [cache.partial(arr, i, h[i], n_workers, executor, accuracy, deriv=2) for i in range(Ndim)]
+        np.copyto(out, d2[0])
+        for d in d2[1:]:
+            out += d
+        return out
+    st = [_stencil2(arr.shape[i], h[i], accuracy) for i in range(Ndim)]
+    
+    def job(axes, t, lo, hi, first):
+        sl = _sl(Ndim, t, slice(lo, hi)) if t is not None else (slice(None),) * Ndim
+        o  = out[sl]
+        tmp = None
+        for j, i in enumerate(axes):
+            if first and j == 0:
+                st[i].apply(arr[sl], i, out=o)
+            else:
+                tmp = st[i].apply(arr[sl], i, out=tmp)
+                o += tmp
+    
+    if Ndim == 1 or (executor is None and (n_workers is None or n_workers <= 1)):
+        job(range(Ndim), None, 0, 0, True)
+        return out
+    # d2/dx_i^2 only couples points along axis i: the terms of axes 1.. are tiled along axis 0, \
+    # then the term of axis 0 is added on tiles along axis 1
+    n_tiles = n_workers if n_workers is not None and n_workers > 1 else os.cpu_count()
+    def run(axes, t, first):
+        bounds = np.unique(np.linspace(0, out.shape[t], min(n_tiles, out.shape[t]) + 1).astype(int))
+        jobs = [(axes, t, lo, hi, first) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        if executor is not None:
+            list(executor.map(lambda a: job(*a), jobs))
+        else:
+            with ThreadPoolExecutor(n_workers) as pool:
+                list(pool.map(lambda a: job(*a), jobs))
+    run(range(1, Ndim), 0, True)
+    run((0,), 1, False)
+    return out
+
+def advection(arr: np.ndarray, *winds: np.ndarray, h: float | tuple[float] = None, 
+              out: np.ndarray = None, cache: DerivativeCache = None, 
+              n_workers: int = None, executor: Executor = None, accuracy: int = 2) -> np.ndarray:
+    """advection term `sum(u_i * dF/dx_i)` of a n-d array by n winds (the tendency is minus this)
+    Args:
+        arr (np.ndarray): n-d array, the advected field
+        winds (*np.ndarray): n n-d arrays, the wind components along each axis
+        h (float | tuple[float | np.ndarray], optional): interval size, default is 1 for all dimensions, \
+            or 1-d coordinates of an axis for non-uniform grids (see `stencil.derivative`)
+        out (np.ndarray, optional): buffer for the result
+        cache (DerivativeCache, optional): memoized partial derivatives
+        n_workers (int, optional): number of threads, the arrays are cut into tiles
+        executor (Executor, optional): run the tiles on this executor (e.g. a shared ThreadPoolExecutor)
+        accuracy (int): order of the truncation error, 2 uses the stencils above, \
+            others use `stencil.derivative` (`n_workers` applies to the 2nd order path only)
+    """
+    Ndim, h = _args_check_VectorCalculus(*winds, h=h)
+    if arr.shape != winds[0].shape:
+        raise ValueError("arr and winds must have the same shape")
+    out = _new_like(arr, out)
+    for i, u in enumerate(winds):
+        d = _partial(arr, i, h, cache, n_workers, executor, accuracy)
+        if i == 0:
+            np.multiply(u, d, out=out)
+        elif cache is None: # d is a fresh buffer
+            d *= u
+            out += d
+        else:
+            out += u * d
+    return out
+
+def deformation(u: np.ndarray, v: np.ndarray, h: float | tuple[float] = None, 
+                cache: DerivativeCache = None, 
+                n_workers: int = None, executor: Executor = None, accuracy: int = 2) -> tuple[np.ndarray, np.ndarray]:
+    """stretching and shearing deformation of 2-d winds
+    Returns:
+        (du/dx - dv/dy, dv/dx + du/dy)
+    """
+    Ndim, h = _args_check_VectorCalculus(u, v, h=h)
+    stretch = _sum_terms([(u, 0, 1), (v, 1, -1)], h, _new_like(u), cache, n_workers, executor, accuracy)
+    shear   = _sum_terms([(v, 0, 1), (u, 1, 1)], h, _new_like(u), cache, n_workers, executor, accuracy)
+    return stretch, shear
+
 # ==================================================
 
 def main():
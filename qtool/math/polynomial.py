@@ -1,9 +1,84 @@
 # Class Polynomial 
 # ==================================================
 import numpy                as np
-import matplotlib.pyplot    as plt
 from   math                 import pi, sin, cos, sqrt
+# matplotlib is imported lazily in `Polynomial.plot` (slow to import)
 # ==================================================
+__all__ = ['horner', 'clenshaw', 'pt_to_poly', 'poly_fit', 'Polynomial', 'PolynomialBatch']
+# ==================================================
+
+def horner(coeff: list|np.ndarray, x, out: np.ndarray = None, deriv: bool = False):
+    """evaluate polynomial(s) by Horner's scheme, vectorized over x
+
+    Args:
+        coeff (list | np.ndarray): shape (n+1,) or (n+1, *batch), order from degree 0 to n
+        x (float | np.ndarray): any shape
+        out (np.ndarray, optional): buffer of shape (*batch, *x.shape) for the value
+        deriv (bool): also return the first derivative (evaluated in the same pass)
+
+    Returns:
+        np.ndarray: p(x) with shape (*batch, *x.shape), or (p(x), p'(x)) if `deriv`
+    """
+    c = np.asarray(coeff)
+    x = np.asarray(x)
+    batch = c.shape[1:]
+    c = c.reshape(c.shape + (1,) * x.ndim) # broadcast batch dims before x dims
+    shape = batch + x.shape
+    dtype = np.result_type(c, x, float)
+
+    p = out if out is not None else np.empty(shape, dtype=dtype)
+    p[...] = c[-1]
+    if deriv: 
+        dp = np.zeros(shape, dtype=dtype)
+    for i in range(c.shape[0] - 2, -1, -1):
+        if deriv:
+            dp *= x
+            dp += p
+        p *= x
+        p += c[i]
+    if p.ndim == 0 and out is None:
+        p = p[()]
+        if deriv: dp = dp[()]
+    return (p, dp) if deriv else p
+
+def clenshaw(coeff: list|np.ndarray, x, domain: tuple[float], out: np.ndarray = None):
+    """evaluate Chebyshev series on `domain` by Clenshaw's recurrence, vectorized over x
+
+    Args:
+        coeff (list | np.ndarray): shape (n+1,) or (n+1, *batch), Chebyshev coefficients T_0 to T_n
+        x (float | np.ndarray): any shape
+        domain (tuple[float]): (a, b) mapped to [-1, 1]
+        out (np.ndarray, optional): buffer of shape (*batch, *x.shape) for the value
+
+    Returns:
+        np.ndarray: p(x) with shape (*batch, *x.shape)
+    """
+    c = np.asarray(coeff)
+    x = np.asarray(x)
+    a, b = domain
+    batch = c.shape[1:]
+    c = c.reshape(c.shape + (1,) * x.ndim)
+    shape = batch + x.shape
+    dtype = np.result_type(c, x, float)
+    t2 = (4*x - 2*(a + b)) / (b - a) # 2t
+
+    b1 = out if out is not None else np.empty(shape, dtype=dtype)
+    b1[...] = 0
+    b2 = np.zeros(shape, dtype=dtype)
+    for i in range(c.shape[0] - 1, 0, -1): # b_k = c_k + 2t b_k+1 - b_k+2
+        b2 *= -1
+        b2 += t2 * b1
+        b2 += c[i]
+        b1, b2 = b2, b1
+    b2 *= -1 # p = c_0 + t b_1 - b_2
+    b2 += 0.5 * t2 * b1
+    b2 += c[0]
+    if out is not None and b2 is not out:
+        out[...] = b2
+        b2 = out
+    if b2.ndim == 0 and out is None:
+        b2 = b2[()]
+    return b2
 
 def pt_to_poly(x: list|np.ndarray, y: list|np.ndarray) -> np.ndarray:
     """n points to n-1 degree polynomial (invertible)
@@ -18,33 +93,128 @@ def pt_to_poly(x: list|np.ndarray, y: list|np.ndarray) -> np.ndarray:
     if len(x)!= len(y):
         raise ValueError("x and y must have the same length")
     
-    x_i = np.array(x).reshape(-1, 1)
-    y_i = np.array(y).reshape(-1, 1)
-    
-    power_x = np.power(x_i, np.arange(x_i.size))
+    x_i = np.array(x).reshape(-1)
+    y_i = np.array(y).reshape(-1)
     
     try:
-        power = np.linalg.inv(power_x)
+        return _solve_vander(_vander(x_i, x_i.size - 1, 'monomial'), y_i)
     except np.linalg.LinAlgError:
         raise ValueError("The polynomial is not invertible")
+
+def _vander(x: np.ndarray, deg: int, basis: str) -> np.ndarray:
+    """**private function**\n
+    Vandermonde matrix of shape (x.size, deg+1) for `basis`
+    """
+    if basis == 'monomial':
+        return np.polynomial.polynomial.polyvander(x, deg)
+    elif basis == 'chebyshev': # x already mapped to [-1, 1]
+        return np.polynomial.chebyshev.chebvander(x, deg)
+    raise ValueError(f"basis {basis} not supported.")
+
+def _solve_vander(V: np.ndarray, y: np.ndarray, rcond=None) -> np.ndarray:
+    """**private function**\n
+    solve V @ c = y (square) or least squares (overdetermined), y is (n,) or (n, m)\n
+    columns of V are equilibrated first, which keeps monomial fits well conditioned
+    """
+    scale = np.linalg.norm(V, axis=0)
+    scale[scale == 0] = 1
+    Vs = V / scale
+    if V.shape[0] == V.shape[1]:
+        c = np.linalg.solve(Vs, y)
+    else:
+        c = np.linalg.lstsq(Vs, y, rcond=rcond)[0]
+    return (c.T / scale).T
+
+def _cheb_to_monomial(deg: int, a: float, b: float) -> np.ndarray:
+    """**private function**\n
+    matrix M of shape (deg+1, deg+1), monomial coeff in x = M @ Chebyshev coeff on [a, b]
+    """
+    M = np.zeros((deg + 1, deg + 1))
+    for j in range(deg + 1):
+        c = np.polynomial.Chebyshev.basis(j, domain=[a, b]).convert(kind=np.polynomial.Polynomial).coef
+        M[:c.size, j] = c
+    return M
+
+def poly_fit(x: list|np.ndarray, y: list|np.ndarray, deg: int = None, basis: str = 'chebyshev', 
+             rcond=None):
+    """fit polynomial(s) to points by `solve` (n = deg+1) or least squares (n > deg+1)
+
+    Args:
+        x (list | np.ndarray): shape (n,), x values shared by all curves
+        y (list | np.ndarray): shape (n,) for 1 curve, (n, m) for m curves (one per column)
+        deg (int, optional): degree of the polynomial, default is n-1 (interpolation)
+        basis (str): 'chebyshev' (fit on x mapped to [-1, 1], stable for high degree) or 'monomial'
+        rcond (float, optional): passed to `np.linalg.lstsq`
+
+    Returns:
+        Polynomial | PolynomialBatch: `Polynomial` for 1-d y, `PolynomialBatch` of m polynomials for 2-d y, \
+            a Chebyshev fit keeps its coefficients and domain [x.min(), x.max()] and is evaluated \
+            by `clenshaw`, `.coeff` converts to the monomial basis on request
+            
+    Example:
+        ```python
+        p  = np.linspace(1000, 100, 50)
+        T  = np.random.rand(50, 10000) + 300 # 10000 profiles
+        pb = poly_fit(p, T, deg=5)           # PolynomialBatch, len(pb) == 10000
+        ```
+    """
+    x = np.asarray(x, dtype=float).reshape(-1)
+    y = np.asarray(y)
+    if y.shape[0] != x.size:
+        raise ValueError("x and y must have the same length")
+    if y.ndim > 2:
+        raise ValueError("y must be 1-d or 2-d with shape (n, m)")
+    if deg is None:
+        deg = x.size - 1
+    if deg + 1 > (n_distinct := np.unique(x).size):
+        raise ValueError(f"at least deg+1 ({deg+1}) distinct x values are required, got {n_distinct}")
+    
+    domain = None
+    if basis == 'chebyshev':
+        a, b = x.min(), x.max()
+        domain = (a, b) if b > a else (a - 1, a + 1) # deg 0 on a single x
+        t = (2*x - (domain[0] + domain[1])) / (domain[1] - domain[0])
+        c = _solve_vander(_vander(t, deg, basis), y, rcond)
+    else:
+        c = _solve_vander(_vander(x, deg, basis), y, rcond)
     
-    return np.dot(power, y_i).reshape(-1)
+    if y.ndim == 1:
+        return Polynomial(c, domain=domain)
+    return PolynomialBatch(c.T, domain=domain)
 
 class Polynomial(object):
-    def __init__(self, coeff: list|np.ndarray, symbol='x'):
+    def __init__(self, coeff: list|np.ndarray, symbol='x', domain: tuple[float] = None):
         """single variable polynomial
         Args:
             coeff (list): order from degree 0 to highest degree \n
                 e.g. [1, 2, 3] represents 1 + 2x + 3x^2
             symbol (str): default is 'x'
+            domain (tuple[float], optional): (a, b), coeff are then Chebyshev coefficients \
+                on [a, b] (see `poly_fit`), evaluated by `clenshaw`
         """
-        self._coeff  = np.array(coeff)
+        if domain is None:
+            self._coeff, self._cheb = np.array(coeff), None
+        else:
+            self._coeff, self._cheb = None, np.array(coeff)
+        self._domain = None if domain is None else tuple(map(float, domain))
         self._symbol = symbol
         self._degree = len(coeff) - 1
     
     @property
     def coeff(self):
+        """monomial coefficients (converted from the Chebyshev basis on first access)"""
+        if self._coeff is None:
+            self._coeff = _cheb_to_monomial(self._degree, *self._domain) @ self._cheb
         return self._coeff
+    
+    @property
+    def cheb_coeff(self):
+        """Chebyshev coefficients on `domain`, None for a monomial polynomial"""
+        return self._cheb
+    
+    @property
+    def domain(self):
+        return self._domain
     @coeff.setter
     def coeff(self, value):
         if type(value) is list or type(value) is np.ndarray:
@@ -58,34 +228,39 @@ class Polynomial(object):
     
     @property
     def roots(self):
+        if self._cheb is not None:
+            return np.polynomial.Chebyshev(self._cheb, domain=self._domain).roots()
         return np.roots(self._coeff[::-1]) 
 
     # magic methods
     def __str__(self):
         s = ""
-        for i in range(len(self._coeff)-1, -1, -1):
-            if self._coeff[i] == 0:
+        coeff = self.coeff
+        for i in range(len(coeff)-1, -1, -1):
+            if coeff[i] == 0:
                 continue
             
             if i == 0:
-                s += str(self._coeff[i])
+                s += str(coeff[i])
             elif i == 1:
-                s += str(self._coeff[i]) + self._symbol
+                s += str(coeff[i]) + self._symbol
             else:
-                s += str(self._coeff[i]) + self._symbol + "^" + str(i)
+                s += str(coeff[i]) + self._symbol + "^" + str(i)
                 
             if i != 0:
                 s += " + "
                 
         return s
     
-    def __call__(self, x):
-        try:
-            return np.array([self(i) for i in x])
-        except:
-            return np.sum(np.power(x, np.arange(0, self.degree+1)).dot(self._coeff))
+    def __call__(self, x, out: np.ndarray = None):
+        """evaluate at x (scalar or array of any shape) by Horner's scheme, or Clenshaw's for Chebyshev"""
+        if self._cheb is not None:
+            return clenshaw(self._cheb, x, self._domain, out=out)
+        return horner(self._coeff, x, out=out)
 
     def __neg__(self):
+        if self._cheb is not None:
+            return Polynomial(-self._cheb, self._symbol, self._domain)
         return Polynomial(-self._coeff)
     
     def __add__(self, other):
@@ -143,9 +318,16 @@ class Polynomial(object):
     # other methods
     def diff(self):
         """returns the derivative of the polynomial"""
+        if self._cheb is not None:
+            a, b = self._domain
+            return Polynomial(np.polynomial.chebyshev.chebder(self._cheb, scl=2/(b - a)), self._symbol, self._domain)
         n = self._coeff.size
         return Polynomial(np.arange(1, n) * self._coeff[1:], self._symbol)
     
+    def to_monomial(self):
+        """same polynomial with monomial coefficients"""
+        return Polynomial(self.coeff, self._symbol)
+    
     def integrate(self, a=None, b=None):
         """
         Args:
@@ -154,7 +336,7 @@ class Polynomial(object):
             
         a and b are None -> antiderivative of the polynomial_
         """
-        n = self._coeff.size
+        n = self.coeff.size
         if a is not None and b is not None:
             new_poly = Polynomial(np.append(0, self.coeff / np.arange(1, n+1)), self._symbol)
             return new_poly(b) - new_poly(a)
@@ -163,8 +345,10 @@ class Polynomial(object):
     
         
     def plot(self, a=-10, b=10, n=101):
+        import matplotlib.pyplot as plt
+        
         x = np.linspace(a, b, n)
-        y = np.array([self(i) for i in x])
+        y = self(x)
         
         fig, ax = plt.subplots(figsize=(6, 6))
         ax.plot(x, y)
@@ -174,4 +358,91 @@ class Polynomial(object):
         ax.set_ylabel("f(x)")
         ax.set_title(f"$f(x) = {self.__str__()}$")
         
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+class PolynomialBatch(object):
+    def __init__(self, coeffs: list|np.ndarray, symbol='x', domain: tuple[float] = None):
+        """many single variable polynomials of the same degree, evaluated together
+        Args:
+            coeffs (list | np.ndarray): shape (n_poly, degree+1), each row ordered \
+                from degree 0 to highest degree
+            symbol (str): default is 'x'
+            domain (tuple[float], optional): (a, b), coeffs are then Chebyshev coefficients on [a, b]
+            
+        Example:
+            ```python
+            pb = PolynomialBatch([[1, 2, 3], [0, 1, 0]])
+            y, dy = pb(np.linspace(0, 1, 1000), deriv=True) # shape (2, 1000)
+            ```
+        """
+        coeffs = np.asarray(coeffs)
+        if coeffs.ndim != 2:
+            raise ValueError("coeffs must be 2-d with shape (n_poly, degree+1)")
+        if domain is None:
+            self._coeff, self._cheb = coeffs, None
+        else:
+            self._coeff, self._cheb = None, coeffs
+        self._domain = None if domain is None else tuple(map(float, domain))
+        self._symbol = symbol
+        self._degree = coeffs.shape[1] - 1
+    
+    @classmethod
+    def from_polynomials(cls, polys: list[Polynomial]):
+        """stack `Polynomial`s (in the monomial basis), lower degrees are padded with zeros"""
+        n = max(p.degree for p in polys) + 1
+        coeffs = np.zeros((len(polys), n), dtype=np.result_type(*[p.coeff for p in polys]))
+        for i, p in enumerate(polys):
+            coeffs[i, :p.degree+1] = p.coeff
+        return cls(coeffs, polys[0]._symbol)
+    
+    @property
+    def coeff(self):
+        """monomial coefficients, shape (n_poly, degree+1) (converted from the Chebyshev basis on first access)"""
+        if self._coeff is None:
+            self._coeff = (_cheb_to_monomial(self._degree, *self._domain) @ self._cheb.T).T
+        return self._coeff
+    
+    @property
+    def cheb_coeff(self):
+        """Chebyshev coefficients on `domain`, None for monomial polynomials"""
+        return self._cheb
+    
+    @property
+    def domain(self):
+        return self._domain
+    
+    @property
+    def degree(self):
+        return self._degree
+    
+    def __len__(self):
+        return (self._coeff if self._cheb is None else self._cheb).shape[0]
+    
+    def __getitem__(self, i):
+        c = self._coeff if self._cheb is None else self._cheb
+        if isinstance(i, (int, np.integer)):
+            return Polynomial(c[i], self._symbol, self._domain)
+        return PolynomialBatch(c[i], self._symbol, self._domain)
+    
+    def __call__(self, x, out: np.ndarray = None, deriv: bool = False):
+        """evaluate all polynomials over x in a single Horner pass
+        Args:
+            x (float | np.ndarray): any shape, shared by all polynomials
+            out (np.ndarray, optional): buffer of shape (n_poly, *x.shape) for the value
+            deriv (bool): also return the first derivatives
+        Returns:
+            np.ndarray: shape (n_poly, *x.shape), or (value, derivative) if `deriv`
+        """
+        if self._cheb is not None:
+            p = clenshaw(self._cheb.T, x, self._domain, out=out)
+            return (p, self.diff()(x)) if deriv else p
+        return horner(self._coeff.T, x, out=out, deriv=deriv)
+    
+    def diff(self):
+        """returns the derivatives of the polynomials"""
+        if self._cheb is not None:
+            a, b = self._domain
+            d = np.polynomial.chebyshev.chebder(self._cheb, scl=2/(b - a), axis=1)
+            return PolynomialBatch(d, self._symbol, self._domain)
+        n = self._degree + 1
+        return PolynomialBatch(np.arange(1, n) * self._coeff[:, 1:], self._symbol)
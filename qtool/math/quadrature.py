@@ -0,0 +1,140 @@
+# Adaptive Gauss-Kronrod quadrature, scalar and batched over many intervals
+# ==================================================
+import numpy as np
+# ==================================================
+__all__ = ['quad', 'quad_batch']
+# ==================================================
+
+# 15-point Kronrod nodes (positive half, last is 0) and weights, 7-point Gauss weights on the odd Kronrod nodes
+_XK = np.array([0.991455371120812639206854697526329, 0.949107912342758524526189684047851, 
+                0.864864423359769072789712788640926, 0.741531185599394439863864773280788, 
+                0.586087235467691130294144845693013, 0.405845151377397166906606412076961, 
+                0.207784955007898467600689403773245, 0.000000000000000000000000000000000])
+_WK = np.array([0.022935322010529224963732008058970, 0.063092092629978553290700663189204, 
+                0.104790010322250183839876322541518, 0.140653259715525918745189590510238, 
+                0.169004726639267902826583426598550, 0.190350578064785409913256402421014, 
+                0.204432940075298892414161999234649, 0.209482141084727828012999174891714])
+_WG = np.array([0.129484966168869693270611432679082, 0.279705391489276667901467771423780, 
+                0.381830050505118944950369775488975, 0.417959183673469387755102040816327])
+# all 15 nodes on [-1, 1] and the matching weights
+_NODES = np.concatenate([-_XK[:-1], _XK[::-1]])
+_WK15  = np.concatenate([_WK[:-1], _WK[::-1]])
+_WG15  = np.zeros(15)
+_WG15[1:7:2], _WG15[7], _WG15[9:15:2] = _WG[:-1], _WG[-1], _WG[-2::-1]
+
+def _gk15(f, lo, hi, args):
+    """**private function**\n
+    Kronrod estimate and QUADPACK error estimate on each [lo, hi], one call of f for all intervals
+    """
+    c, hl = (lo + hi) / 2, (hi - lo) / 2
+    x  = c[:, None] + hl[:, None] * _NODES
+    fx = np.asarray(f(x.ravel(), *args), dtype=float).reshape(x.shape)
+    K  = (fx @ _WK15) * hl
+    G  = (fx @ _WG15) * hl
+    ahl = np.abs(hl)
+    resasc = (np.abs(fx - (K / np.where(hl == 0, 1, 2*hl))[:, None]) @ _WK15) * ahl
+    err = np.abs(K - G)
+    scale = np.where(resasc > 0, np.minimum(1, (200 * err / np.where(resasc > 0, resasc, 1))**1.5), 1)
+    err = np.where(resasc > 0, resasc * scale, err)
+    # round-off floor
+    resabs = (np.abs(fx) @ _WK15) * ahl
+    err = np.maximum(err, 50 * np.finfo(float).eps * resabs)
+    return K, err
+
+def quad_batch(f, a: np.ndarray, b: np.ndarray, args: tuple = (), rtol: float = 1e-8, atol: float = 1e-12, 
+               max_depth: int = 40) -> tuple[np.ndarray, np.ndarray, dict]:
+    """integrate one vectorized f over many [a, b] by adaptive Gauss-Kronrod (G7, K15)\n
+    Every round evaluates f once on the nodes of all the unresolved subintervals of all the integrals, \\
+    then bisects the subintervals that miss their share of the tolerance, \\
+    `max(atol, rtol * |I|) * width / |b - a|`, until the summed error estimate of each integral \\
+    is within `max(atol, rtol * |I|)`.
+    Args:
+        f (Callable): f(x, *args) -> array like x, vectorized over a 1-d x
+        a (np.ndarray): lower limits (finite), broadcast with b
+        b (np.ndarray): upper limits (finite)
+        args (tuple): extra arguments of f
+        rtol (float): relative tolerance of each integral
+        atol (float): absolute tolerance of each integral
+        max_depth (int): maximum number of bisections of a subinterval
+    Returns:
+        I (np.ndarray): integrals, shape of `broadcast(a, b)`
+        err (np.ndarray): error estimates
+        stats (dict): 'n_eval' (evaluations of f at single points), 'n_calls' (calls of f), \\
+            'n_intervals' (subintervals evaluated), 'converged' (bool array)
+    Example:
+        ```python
+        z = np.linspace(0, 10e3, 20001) # layer edges
+        I, err, stats = quad_batch(lambda x: np.exp(-x / 8e3), z[:-1], z[1:])
+        ```
+    """
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+    shape = a.shape
+    a, b = a.ravel(), b.ravel()
+    if not (np.isfinite(a).all() and np.isfinite(b).all()):
+        raise ValueError("a and b must be finite")
+    m = a.size
+    I, err = np.zeros(m), np.zeros(m)
+    converged = np.ones(m, dtype=bool)
+    width = np.abs(b - a)
+    width[width == 0] = 1
+    lo, hi, owner = a.copy(), b.copy(), np.arange(m)
+    stats = {'n_eval': 0, 'n_calls': 0, 'n_intervals': 0}
+    for depth in range(max_depth + 1):
+        K, E = _gk15(f, lo, hi, args)
+        stats['n_eval'] += 15 * lo.size
+        stats['n_calls'] += 1
+        stats['n_intervals'] += lo.size
+        est = I + np.bincount(owner, K, minlength=m)
+        tol = np.maximum(atol, rtol * np.abs(est))
+        # local share of the tolerance, or the whole integral is within tolerance
+        done = err + np.bincount(owner, E, minlength=m) <= tol
+        ok = (E <= tol[owner] * np.abs(hi - lo) / width[owner]) | done[owner]
+        if depth == max_depth:
+            converged[owner[~ok]] = False
+            ok[:] = True
+        I   += np.bincount(owner[ok], K[ok], minlength=m)
+        err += np.bincount(owner[ok], E[ok], minlength=m)
+        if ok.all():
+            break
+        lo, hi, owner = lo[~ok], hi[~ok], owner[~ok]
+        mid = (lo + hi) / 2
+        lo, hi, owner = np.concatenate([lo, mid]), np.concatenate([mid, hi]), np.concatenate([owner, owner])
+    stats['converged'] = converged.reshape(shape)
+    return I.reshape(shape), err.reshape(shape), stats
+
+def quad(f, a: float, b: float, args: tuple = (), rtol: float = 1e-8, atol: float = 1e-12, 
+         max_depth: int = 40) -> tuple[float, float, dict]:
+    """integrate f from a to b by adaptive Gauss-Kronrod (G7, K15), see `quad_batch`\n
+    Returns:
+        I (float), err (float), stats (dict) with 'converged' as a bool
+    Example:
+        ```python
+        I, err, stats = quad(np.sin, 0, np.pi) # 2, stats['n_eval'] = 15
+        ```
+    """
+    I, err, stats = quad_batch(f, a, b, args, rtol, atol, max_depth)
+    stats['converged'] = bool(stats['converged'])
+    return float(I), float(err), stats
+
+# ==================================================
+
+def main():
+    from .numerical import integrate
+    
+    f = lambda x: np.exp(-x**2) * np.cos(5*x)
+    print('integrate :', integrate(f, -10, 10), '(1001 evaluations)')
+    I, err, stats = quad(f, -10, 10)
+    print('quad      :', I, err, stats)
+    
+    z = np.linspace(0, 10e3, 20001)
+    I, err, stats = quad_batch(lambda x: np.exp(-x / 8e3), z[:-1], z[1:])
+    print('batch     :', np.abs(I.sum() - 8e3*(1 - np.exp(-10/8))), 
+          {k: v for k, v in stats.items() if k != 'converged'})
+
+# ==================================================
+from time import perf_counter
+if __name__ == '__main__':
+    start_time = perf_counter()
+    main()
+    end_time = perf_counter()
+    print('\ntime :%.3f ms' %((end_time - start_time)*1000))
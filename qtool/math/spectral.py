@@ -0,0 +1,187 @@
+# Spectral (FFT) derivatives for periodic domains
+# ==================================================
+from functools import lru_cache
+
+import numpy as np
+
+from .numerical import _args_check_VectorCalculus, _new_like, _deriv, _curl_terms
+from .stencil import derivative
+# ==================================================
+__all__ = ['wavenumbers', 'spectral_gradient', 'spectral_divergence', 'spectral_curl', 'spectral_laplacian']
+# ==================================================
+
+def _periodic_axes(periodic, Ndim):
+    """**private function**\n
+    tuple of the periodic axes
+    """
+    if isinstance(periodic, bool):
+        periodic = (periodic,) * Ndim
+    if len(periodic) != Ndim:
+        raise ValueError("len(periodic) must be equal to the ndim of the array")
+    return tuple(i for i, p in enumerate(periodic) if p)
+
+@lru_cache(maxsize=32)
+def wavenumbers(shape: tuple[int], h: tuple[float], axes: tuple[int]) -> tuple[np.ndarray, ...]:
+    """angular wavenumbers of `np.fft.rfftn(Y, axes=axes)`, cached per grid
+    Args:
+        shape (tuple[int]): shape of the real array
+        h (tuple[float]): interval of each axis in `axes`
+        axes (tuple[int]): transformed axes, the last one is the half spectrum
+    Returns:
+        tuple[np.ndarray]: one k per axis in `axes`, shaped to broadcast against the spectrum, \\
+            the Nyquist mode of even lengths is 0 (for odd derivatives)
+    """
+    res = []
+    for j, (a, h_a) in enumerate(zip(axes, h)):
+        n = shape[a]
+        k = 2*np.pi * (np.fft.rfftfreq(n, d=h_a) if j == len(axes) - 1 else np.fft.fftfreq(n, d=h_a))
+        if n % 2 == 0:
+            k[n//2] = 0
+        bshape = [1] * len(shape)
+        bshape[a] = k.size
+        k = k.reshape(bshape)
+        k.flags.writeable = False
+        res.append(k)
+    return tuple(res)
+
+@lru_cache(maxsize=32)
+def _k2(shape, h, axes):
+    """**private function**\n
+    |k|^2 of the spectrum, with the Nyquist modes kept (for the Laplacian)
+    """
+    k2 = 0
+    for j, (a, h_a) in enumerate(zip(axes, h)):
+        n = shape[a]
+        k = 2*np.pi * (np.fft.rfftfreq(n, d=h_a) if j == len(axes) - 1 else np.fft.fftfreq(n, d=h_a))
+        bshape = [1] * len(shape)
+        bshape[a] = k.size
+        k2 = k2 + k.reshape(bshape)**2
+    return k2
+
+def _spectral_sum(terms, h, paxes, out, accuracy=2):
+    """**private function**\n
+    out = sum(sign * dY/dx_axis for Y, axis, sign in terms), \n
+    periodic axes are summed in spectral space and transformed back once, the others use finite difference
+    """
+    shape = out.shape
+    hp    = tuple(float(h[a]) for a in paxes)
+    spec, ffts = None, {}
+    for Y, axis, sign in terms:
+        if axis not in paxes:
+            continue
+        if id(Y) not in ffts:
+            ffts[id(Y)] = np.fft.rfftn(Y, axes=paxes)
+        k = wavenumbers(shape, hp, paxes)[paxes.index(axis)]
+        term = (1j * sign) * k * ffts[id(Y)]
+        spec = term if spec is None else spec.__iadd__(term)
+    if spec is not None:
+        out[...] = np.fft.irfftn(spec, s=[shape[a] for a in paxes], axes=paxes)
+    else:
+        out[...] = 0
+    for Y, axis, sign in terms:
+        if axis in paxes:
+            continue
+        d = _deriv(Y, axis, h[axis], accuracy)
+        np.add(out, d, out=out) if sign > 0 else np.subtract(out, d, out=out)
+    return out
+
+def spectral_gradient(*arrs: np.ndarray, h: float | tuple[float] = None, periodic: bool | tuple[bool] = True,
+                      accuracy: int = 2) -> list[np.ndarray]:
+    """`gradient` by FFT along periodic axes, spectral accuracy\n
+    Args:
+        arrs (*np.ndarray): n-d arrays, periodic axes must not repeat the first point at the end
+        h (float | tuple[float], optional): interval size, default is 1 for all dimensions, \\
+            the period of an axis is `n * h`
+        periodic (bool | tuple[bool]): periodic flag of each axis, non-periodic axes use finite difference
+        accuracy (int): accuracy of the finite difference on non-periodic axes, see `gradient`
+    Returns:
+        res (list[np.ndarray]): dF_i/dx_i of each array
+    Example:
+        ```python
+        x = np.arange(128) * 2*np.pi/128 # no end point
+        X, Y = np.meshgrid(x, x, indexing='ij')
+        du_dx, dv_dy = spectral_gradient(np.sin(X), np.cos(Y), h=x[1])
+        ```
+    """
+    Ndim, h = _args_check_VectorCalculus(*arrs, h=h)
+    paxes = _periodic_axes(periodic, Ndim)
+    return [_spectral_sum([(arr, i, 1)], h, paxes, _new_like(arr), accuracy) for i, arr in enumerate(arrs)]
+
+def spectral_divergence(*arrs: np.ndarray, h: float | tuple[float] = None, periodic: bool | tuple[bool] = True,
+                        accuracy: int = 2, out: np.ndarray = None) -> np.ndarray:
+    """`divergence` by FFT along periodic axes, see `spectral_gradient`\n
+    the periodic terms are summed in spectral space, one inverse transform in total
+    """
+    Ndim, h = _args_check_VectorCalculus(*arrs, h=h)
+    paxes = _periodic_axes(periodic, Ndim)
+    return _spectral_sum([(arr, i, 1) for i, arr in enumerate(arrs)], h, paxes, 
+                         _new_like(arrs[0], out), accuracy)
+
+def spectral_curl(*arrs: np.ndarray, h: float | tuple[float] = None, periodic: bool | tuple[bool] = True,
+                  accuracy: int = 2) -> np.ndarray | list[np.ndarray]:
+    """`curl` of 2 or 3-d arrays by FFT along periodic axes, see `spectral_gradient`\n
+    each array is transformed once
+    """
+    Ndim, h = _args_check_VectorCalculus(*arrs, h=h)
+    paxes = _periodic_axes(periodic, Ndim)
+    if Ndim not in (2, 3):
+        raise ValueError("curl is only for 2 or 3-d arrays")
+    shape = arrs[0].shape
+    ffts = {i: np.fft.rfftn(arr, axes=paxes) for i, arr in enumerate(arrs)} if paxes else {}
+    res = []
+    for terms in _curl_terms(list(range(Ndim))): # terms by index of arrs
+        out = _new_like(arrs[0])
+        spec = None
+        for i, axis, sign in terms:
+            if axis in paxes:
+                k = wavenumbers(shape, tuple(float(h[a]) for a in paxes), paxes)[paxes.index(axis)]
+                term = (1j * sign) * k * ffts[i]
+                spec = term if spec is None else spec.__iadd__(term)
+        out[...] = np.fft.irfftn(spec, s=[shape[a] for a in paxes], axes=paxes) if spec is not None else 0
+        for i, axis, sign in terms:
+            if axis not in paxes:
+                d = _deriv(arrs[i], axis, h[axis], accuracy)
+                np.add(out, d, out=out) if sign > 0 else np.subtract(out, d, out=out)
+        res.append(out)
+    return res[0] if Ndim == 2 else res
+
+def spectral_laplacian(arr: np.ndarray, h: float | tuple[float] = None, periodic: bool | tuple[bool] = True,
+                       accuracy: int = 2, out: np.ndarray = None) -> np.ndarray:
+    """laplacian by FFT along periodic axes (`-|k|^2`), 
+    non-periodic axes use the compact 2nd derivative stencil of `stencil.derivative`, see `spectral_gradient`
+    """
+    Ndim, h = _args_check_VectorCalculus(*(arr,) * arr.ndim, h=h)
+    paxes = _periodic_axes(periodic, Ndim)
+    out = _new_like(arr, out)
+    if paxes:
+        spec = np.fft.rfftn(arr, axes=paxes)
+        spec *= -_k2(arr.shape, tuple(float(h[a]) for a in paxes), paxes)
+        out[...] = np.fft.irfftn(spec, s=[arr.shape[a] for a in paxes], axes=paxes)
+    else:
+        out[...] = 0
+    for axis in range(Ndim):
+        if axis not in paxes:
+            kw = {'h': h[axis]} if np.ndim(h[axis]) == 0 else {'x': h[axis]}
+            out += derivative(arr, axis=axis, deriv=2, accuracy=accuracy, **kw)
+    return out
+
+# ==================================================
+
+def main():
+    from .numerical import divergence
+    
+    for n in (16, 32, 64):
+        x = np.arange(n) * 2*np.pi / n
+        X, Y = np.meshgrid(x, x, indexing='ij')
+        u, v = np.sin(X) * np.cos(2*Y), np.exp(np.sin(Y))
+        ana = np.cos(X) * np.cos(2*Y) + np.cos(Y) * np.exp(np.sin(Y))
+        print(f'n = {n:3d}, spectral err: {np.abs(spectral_divergence(u, v, h=x[1]) - ana).max():.3g}, '
+              f'fd err: {np.abs(divergence(u, v, h=x[1]) - ana).max():.3g}')
+
+# ==================================================
+from time import perf_counter
+if __name__ == '__main__':
+    start_time = perf_counter()
+    main()
+    end_time = perf_counter()
+    print('\ntime :%.3f ms' %((end_time - start_time)*1000))
@@ -0,0 +1,210 @@
+# Finite difference stencils of arbitrary order on uniform and non-uniform grids
+# ==================================================
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+# ==================================================
+__all__ = ['fd_weights', 'Stencil', 'get_stencil', 'derivative']
+# ==================================================
+
+def fd_weights(z: float | np.ndarray, x: np.ndarray, m: int) -> np.ndarray:
+    """finite difference weights by Fornberg's algorithm (Fornberg, 1988)
+    Args:
+        z (float | np.ndarray): point(s) where the derivatives are approximated, shape (P,)
+        x (np.ndarray): nodes of the stencil, shape (w,), or (P, w) for one stencil per point
+        m (int): highest derivative order
+    Returns:
+        np.ndarray: weights, shape (w, m+1) or (P, w, m+1), [..., k] is for the k-th derivative
+    Example:
+        ```python
+        fd_weights(0, [-1, 0, 1], 2)[:, 1] # [-0.5, 0, 0.5]
+        ```
+    """
+    z, x = np.asarray(z, dtype=float), np.asarray(x, dtype=float)
+    single = x.ndim == 1
+    z, x = np.atleast_1d(z), np.atleast_2d(x)
+    P, w = x.shape
+    c = np.zeros((P, w, m + 1))
+    c[:, 0, 0] = 1
+    c1, c4 = np.ones(P), x[:, 0] - z
+    for i in range(1, w):
+        mn = min(i, m)
+        c2, c5, c4 = np.ones(P), c4, x[:, i] - z
+        for j in range(i):
+            c3 = x[:, i] - x[:, j]
+            c2 = c2 * c3
+            if j == i - 1:
+                for k in range(mn, 0, -1):
+                    c[:, i, k] = c1 * (k * c[:, i-1, k-1] - c5 * c[:, i-1, k]) / c2
+                c[:, i, 0] = -c1 * c5 * c[:, i-1, 0] / c2
+            for k in range(mn, 0, -1):
+                c[:, j, k] = (c4 * c[:, j, k] - k * c[:, j, k-1]) / c3
+            c[:, j, 0] = c4 * c[:, j, 0] / c3
+        c1 = c2
+    return c[0] if single else c
+
+def _sl(ndim, axis, s):
+    """**private function**\n
+    index tuple with slice `s` on `axis`
+    """
+    idxer = [slice(None)] * ndim
+    idxer[axis] = s
+    return tuple(idxer)
+
+def _axis(axis, ndim):
+    """**private function**\n
+    axis in [0, ndim), negative axes count from the end
+    """
+    if not -ndim <= axis < ndim:
+        raise ValueError(f"axis {axis} is out of bounds for an array of dimension {ndim}")
+    return axis % ndim
+
+class Stencil(object):
+    """precomputed finite difference weights of the `deriv`-th derivative on one grid
+    Args:
+        x (np.ndarray, optional): 1-d coordinates (non-uniform grid), sorted
+        n (int, optional): number of points of a uniform grid (if x is not given)
+        h (float): interval of the uniform grid
+        deriv (int): order of the derivative
+        accuracy (int): order of the truncation error, `O(h^accuracy)`
+    Note:
+        centered stencils inside, one-sided stencils with the same accuracy near the boundaries; \\
+        `Stencil(n=n, h=h)` (deriv 1, accuracy 2) is the stencil of `gradient`
+    """
+    def __init__(self, x: np.ndarray = None, n: int = None, h: float = 1., deriv: int = 1, accuracy: int = 2):
+        if deriv < 1 or accuracy < 1:
+            raise ValueError("deriv and accuracy must be >= 1")
+        if x is not None:
+            x = np.asarray(x, dtype=float).reshape(-1)
+            dx = np.diff(x)
+            if np.any(dx <= 0): raise ValueError("x must be strictly increasing")
+            if np.allclose(dx, dx[0], rtol=1e-12, atol=0): # uniform after all
+                n, h, x = x.size, dx[0], None
+            else:
+                n = x.size
+        elif n is None:
+            raise ValueError("x or n must be given")
+        self.n, self.h, self.deriv, self.accuracy = n, h, deriv, accuracy
+        self.uniform = x is None
+        
+        m, p = deriv, accuracy
+        width_b = m + p                                   # one-sided
+        width_c = 2*((m + 1)//2) - 1 + p if self.uniform else m + p + (m + p + 1) % 2 # centered, odd
+        if n < max(width_b, width_c):
+            raise ValueError(f"at least {max(width_b, width_c)} points are required, got {n}")
+        self.half = half = width_c // 2
+        offsets = np.arange(-half, half + 1)
+        
+        if self.uniform:
+            self._wc = fd_weights(0, offsets, m)[:, m] / h**m      # (width_c,)
+            wb = fd_weights(np.arange(half), np.tile(np.arange(width_b), (half, 1)), m)[..., m]
+            self._bnd = [(i, 0, wb[i] / h**m) for i in range(half)] + \
+                        [(n-1-i, n-width_b, (-1)**m * wb[i][::-1] / h**m) for i in range(half)] # mirrored
+        else:
+            idx = np.arange(half, n - half)
+            self._wc = fd_weights(x[idx], x[idx[:, None] + offsets], m)[..., m] # (n_int, width_c)
+            self._bnd = []
+            for i in list(range(half)) + list(range(n - half, n)):
+                s = 0 if i < half else n - width_b
+                self._bnd.append((i, s, fd_weights(x[i], x[s:s+width_b], m)[:, m]))
+        self.x = x
+    
+    def apply(self, Y: np.ndarray, axis: int = 0, out: np.ndarray = None) -> np.ndarray:
+        """the derivative of Y along axis, by shifted-slice accumulation
+        Args:
+            Y (np.ndarray): n-d array, Y.shape[axis] == n
+            axis (int): 
+            out (np.ndarray, optional): buffer with the shape of Y
+        """
+        Y = np.asarray(Y)
+        axis = _axis(axis, Y.ndim) # the weights of non-uniform grids are reshaped from axis
+        nd, n = Y.ndim, Y.shape[axis]
+        if n != self.n: raise ValueError(f"Y.shape[axis] ({n}) != n of the stencil ({self.n})")
+        if out is None:
+            out = np.empty(Y.shape, dtype=np.result_type(Y, float))
+        elif out.shape != Y.shape:
+            raise ValueError(f"out.shape {out.shape} != {Y.shape}")
+        
+        a, b, half = self.half, n - self.half, self.half
+        o   = out[_sl(nd, axis, slice(a, b))]
+        tmp = np.empty_like(o) if self._wc.shape[0] > 1 else None
+        for j, off in enumerate(range(-half, half + 1)):
+            w  = self._wc[j] if self.uniform else self._wc[:, j].reshape((-1,) + (1,) * (nd - axis - 1))
+            ys = Y[_sl(nd, axis, slice(a + off, b + off))]
+            if j == 0:
+                np.multiply(ys, w, out=o)
+            else:
+                np.multiply(ys, w, out=tmp)
+                o += tmp
+        for i, s, w in self._bnd: # boundary planes
+            plane = out[_sl(nd, axis, slice(i, i + 1))]
+            np.multiply(Y[_sl(nd, axis, slice(s, s + 1))], w[0], out=plane)
+            for j in range(1, w.size):
+                plane += w[j] * Y[_sl(nd, axis, slice(s + j, s + j + 1))]
+        return out
+
+# weights cache, one `Stencil` per (grid, deriv, accuracy)
+_stencils = OrderedDict()
+_STENCIL_CACHE_SIZE = 64
+
+def _grid_key(x=None, n=None, h=1.):
+    """**private function**\n
+    hashable key of a grid
+    """
+    if x is None:
+        return ('uniform', n, float(h))
+    x = np.ascontiguousarray(x, dtype=float)
+    return ('coords', x.size, hashlib.sha1(x.tobytes()).hexdigest())
+
+def get_stencil(x: np.ndarray = None, n: int = None, h: float = 1., deriv: int = 1, accuracy: int = 2) -> Stencil:
+    """cached `Stencil`, the weights of a grid are computed once"""
+    key = (_grid_key(x, n, h), deriv, accuracy)
+    if key in _stencils:
+        _stencils.move_to_end(key)
+        return _stencils[key]
+    st = _stencils[key] = Stencil(x, n, h, deriv, accuracy)
+    while len(_stencils) > _STENCIL_CACHE_SIZE:
+        _stencils.popitem(last=False)
+    return st
+
+def derivative(Y: np.ndarray, x: np.ndarray = None, h: float = 1., axis: int = 0, 
+               deriv: int = 1, accuracy: int = 2, out: np.ndarray = None) -> np.ndarray:
+    """`deriv`-th derivative of Y along axis, truncation error `O(h^accuracy)`
+    Args:
+        Y (np.ndarray): n-d array
+        x (np.ndarray, optional): 1-d coordinates of the axis (non-uniform grid, e.g. pressure or height)
+        h (float): interval of a uniform grid, if x is not given
+        axis (int): 
+        deriv (int): order of the derivative
+        accuracy (int): order of accuracy
+        out (np.ndarray, optional): buffer with the shape of Y
+    Example:
+        ```python
+        p = np.array([1000, 925, 850, 700, 500, 300, 200, 100.])
+        dT_dp = derivative(T, x=p[::-1], axis=0)  # T on increasing p, shape (8, ny, nx)
+        d4 = derivative(Y, h=dx, axis=1, accuracy=4)
+        ```
+    """
+    Y = np.asarray(Y)
+    axis = _axis(axis, Y.ndim)
+    return get_stencil(x, Y.shape[axis], h, deriv, accuracy).apply(Y, axis, out)
+
+# ==================================================
+
+def main():
+    x = np.sort(np.random.rand(200)) * 2*np.pi
+    for p in (2, 4, 6):
+        err = np.abs(derivative(np.sin(x), x=x, accuracy=p) - np.cos(x)).max()
+        print(f'non-uniform, accuracy {p}: max err {err:.3g}')
+    Y = np.sin(x) * np.arange(1, 4)[:, None] # (3, 200), the last axis is non-uniform
+    err = np.abs(derivative(Y, x=x, axis=-1, accuracy=4) - np.cos(x) * np.arange(1, 4)[:, None]).max()
+    print(f'non-uniform, axis -1: max err {err:.3g}')
+
+# ==================================================
+from time import perf_counter
+if __name__ == '__main__':
+    start_time = perf_counter()
+    main()
+    end_time = perf_counter()
+    print('\ntime :%.3f ms' %((end_time - start_time)*1000))
@@ -1,9 +1,10 @@
 # Class Vector 
 # ==================================================
 import numpy                as np
-import matplotlib.pyplot    as plt
 from   math                 import pi, sin, cos, sqrt
 # ==================================================
+__all__ = ['Vector', 'dot', 'cross', 'angle']
+# ==================================================
 
 class Vector(object):
     """2D Vector
@@ -118,6 +119,8 @@ def angle(v1, v2):
 # ==================================================
 
 def main():
+    import matplotlib.pyplot as plt
+    
     plt.xlim(-10, 10)
     plt.ylim(-10, 10)
     plt.xticks(np.arange(-10, 11, 2))
@@ -0,0 +1,162 @@
+# CAPE / CIN of whole 3-d grids, columns split over a process pool with shared memory
+# ==================================================
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .thermo import Rd
+from .parcel import parcel_profile
+# ==================================================
+__all__ = ['cape_cin']
+# ==================================================
+
+def _clipped_integral(l0, l1, b0, b1, lo, hi, negative=False):
+    """**private function**\n
+    integral of B (linear in ln(p) on each layer [l1, l0], l1 < l0) over the part of the layer in [lo, hi], \\
+    only the negative part of B if `negative`
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        a, b = np.clip(l1, lo, hi), np.clip(l0, lo, hi)
+        slope = np.where(l0 != l1, (b0 - b1) / (l0 - l1), 0)
+        ba, bb = b1 + slope * (a - l1), b1 + slope * (b - l1)
+        if not negative:
+            return (ba + bb) / 2 * (b - a)
+        # negative part of a linear segment
+        na, nb = np.minimum(ba, 0), np.minimum(bb, 0)
+        full = (na + nb) / 2 * (b - a)
+        cross = (ba < 0) != (bb < 0)
+        neg = np.where(ba < 0, ba, bb)
+        part = neg**2 / (2 * np.abs(ba - bb)) * (b - a)
+        return np.where(cross, -np.nan_to_num(part), full)
+
+def _cape_cin_columns(p, T, qv, dlnp=0.02, table=None):
+    """**private function**\n
+    CAPE and CIN [J/kg] of columns (nz, ncol): Rd * integral of (T_parcel - T) d(ln p), \\
+    CAPE between the LFC and the EL, CIN the negative area below the LFC; 0 without LFC
+    """
+    res = parcel_profile(p, T, qv, dlnp=dlnp, table=table)
+    p   = np.broadcast_to(p, T.shape)
+    B   = res['T_parcel'] - T
+    lnp = np.log(p)
+    l0, l1, b0, b1 = lnp[:-1], lnp[1:], B[:-1], B[1:] # layers, l1 < l0
+    lnp_lfc = np.log(res['p_lfc'])
+    lnp_el  = np.log(np.where(np.isnan(res['p_el']), p[-1], res['p_el']))
+    has_lfc = ~np.isnan(lnp_lfc)
+    lnp_lfc = np.where(has_lfc, lnp_lfc, lnp[0])
+    cape = _clipped_integral(l0, l1, b0, b1, lnp_el, lnp_lfc).sum(axis=0)
+    cin  = _clipped_integral(l0, l1, b0, b1, lnp_lfc, lnp[0], negative=True).sum(axis=0)
+    return np.where(has_lfc, Rd * cape, 0), np.where(has_lfc, Rd * cin, 0)
+
+def _attach(name):
+    """**private function**\n
+    attach to a shared memory block created by `cape_cin`, without registering it for cleanup
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError: # Python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+def _shm_worker(spec, lo, hi, dlnp, table=None):
+    """**private function**\n
+    compute columns [lo, hi) of the shared arrays described by spec {key: (name, shape)}
+    """
+    blocks = {k: _attach(name) for k, (name, shape) in spec.items()}
+    try:
+        arr = {k: np.ndarray(spec[k][1], dtype=float, buffer=blocks[k].buf) for k in spec}
+        p = arr['p'] if arr['p'].shape[1] == 1 else arr['p'][:, lo:hi]
+        arr['cape'][lo:hi], arr['cin'][lo:hi] = _cape_cin_columns(
+            p, arr['T'][:, lo:hi], arr['qv'][:, lo:hi], dlnp, table)
+        del arr, p
+    finally:
+        for shm in blocks.values():
+            shm.close()
+    return hi - lo
+
+def cape_cin(p: np.ndarray, T: np.ndarray, qv: np.ndarray, n_workers: int = None, executor: Executor = None,
+             chunk_cols: int = None, dlnp: float = 0.02, table=None) -> tuple[np.ndarray, np.ndarray]:
+    """CAPE and CIN [J/kg] of the surface parcel of every column\n
+    `Rd * integral of (T_parcel - T) d(ln p)`: CAPE between the LFC and the EL (the top if the parcel \\
+    is still buoyant), CIN the negative area between the surface and the LFC; both are 0 without an LFC. \\
+    The parcels are lifted by `parcel.parcel_profile`, columns are split into chunks \\
+    computed by a process pool reading and writing shared memory (no pickling of the fields).
+    Args:
+        p (np.ndarray): pressure [hPa], (nz,) or (nz, ...), decreasing along axis 0
+        T (np.ndarray): Temp. [K], (nz, ...), e.g. (nz, ny, nx)
+        qv (np.ndarray): specific humidity [kg/kg], (nz, ...)
+        n_workers (int, optional): processes, default is `os.cpu_count()`, 1 runs in this process
+        executor (Executor, optional): process pool to reuse instead of creating one
+        chunk_cols (int, optional): columns per task, default splits the columns in 4 tasks per worker
+        dlnp (float): maximum RK4 step in ln(p) along the moist adiabat
+        table (lookup.PseudoAdiabatTable, optional): pseudo-adiabat table, a saved table reaches \\
+            the workers as its path and is memory-mapped there
+    Returns:
+        cape (np.ndarray): shape (...)
+        cin (np.ndarray): shape (...), <= 0
+    Example:
+        ```python
+        cape, cin = cape_cin(p, T, qv, n_workers=8) # T, qv: (nz, ny, nx) -> (ny, nx)
+        ```
+    """
+    T, qv, p = np.asarray(T, dtype=float), np.asarray(qv, dtype=float), np.asarray(p, dtype=float)
+    if T.shape != qv.shape:
+        raise ValueError(f"T.shape {T.shape} != qv.shape {qv.shape}")
+    if p.shape != T.shape and p.shape != T.shape[:1]:
+        raise ValueError(f"p.shape {p.shape} must be ({T.shape[0]},) or T.shape {T.shape}")
+    nz, col_shape = T.shape[0], T.shape[1:]
+    ncol = int(np.prod(col_shape))
+    fields = {'p': p.reshape(nz, -1) if p.ndim > 1 else p.reshape(nz, 1), 
+              'T': T.reshape(nz, ncol), 'qv': qv.reshape(nz, ncol)}
+    n_workers = n_workers or os.cpu_count() or 1
+    if n_workers == 1 and executor is None:
+        cape, cin = _cape_cin_columns(fields['p'], fields['T'], fields['qv'], dlnp, table)
+        return cape.reshape(col_shape), cin.reshape(col_shape)
+    
+    chunk_cols = chunk_cols or max(1, -(-ncol // (4 * n_workers)))
+    shapes = {**{k: v.shape for k, v in fields.items()}, 'cape': (ncol,), 'cin': (ncol,)}
+    blocks = {}
+    try:
+        for k, shape in shapes.items():
+            blocks[k] = shared_memory.SharedMemory(create=True, size=max(8 * int(np.prod(shape)), 1))
+            if k in fields:
+                np.ndarray(shape, dtype=float, buffer=blocks[k].buf)[...] = fields[k]
+        spec = {k: (blocks[k].name, shapes[k]) for k in shapes}
+        bounds = list(range(0, ncol, chunk_cols)) + [ncol]
+        n_tasks = len(bounds) - 1
+        args = ([spec] * n_tasks, bounds[:-1], bounds[1:], [dlnp] * n_tasks, [table] * n_tasks)
+        if executor is None:
+            with ProcessPoolExecutor(n_workers) as pool:
+                list(pool.map(_shm_worker, *args))
+        else:
+            list(executor.map(_shm_worker, *args))
+        cape = np.ndarray((ncol,), dtype=float, buffer=blocks['cape'].buf).reshape(col_shape).copy()
+        cin  = np.ndarray((ncol,), dtype=float, buffer=blocks['cin'].buf).reshape(col_shape).copy()
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+    return cape, cin
+
+# ==================================================
+
+def main():
+    nz, ny, nx = 50, 200, 200
+    p   = np.linspace(1000, 100, nz)
+    rng = np.random.default_rng(0)
+    T0  = 300 + rng.normal(0, 2, (ny, nx))
+    T   = np.maximum(T0 - 6.5e-3 * (-Rd * 250 / 9.81 * np.log(p / 1000))[:, None, None], 210)
+    qv  = 0.016 * (p / 1000)[:, None, None]**3 * np.ones((ny, nx))
+    for n in (1, os.cpu_count()):
+        t0 = perf_counter()
+        cape, cin = cape_cin(p, T, qv, n_workers=n)
+        print(f'{ny*nx} columns, {n} workers: {(perf_counter() - t0):.2f} s, '
+              f'mean CAPE {cape.mean():.1f}, mean CIN {cin.mean():.1f} J/kg')
+
+# ==================================================
+from time import perf_counter
+if __name__ == '__main__':
+    start_time = perf_counter()
+    main()
+    end_time = perf_counter()
+    print('\ntime :%.3f ms' %((end_time - start_time)*1000))
@@ -0,0 +1,198 @@
+# Parcel lifting: LCL, LFC, EL and parcel temperature of many columns at once
+# ==================================================
+import numpy as np
+
+from .thermo import Rd, Cp, g, cc_equation, anti_cc_equation, e_2_qv, qv_2_e, gamma_m
+# ==================================================
+__all__ = ['lcl', 'moist_lapse', 'lift_parcel', 'parcel_profile']
+# ==================================================
+# pressure [hPa], Temp. [K], specific humidity [kg/kg], levels on axis 0
+
+def lcl(p0: np.ndarray, T0: np.ndarray, qv0: np.ndarray, 
+        tol: float = 1e-3, max_iter: int = 50) -> tuple[np.ndarray, np.ndarray]:
+    """lifting condensation level of parcels by fixed point iteration\n
+    dry ascent keeps theta and qv, the LCL is where the parcel Temp. meets its dew point, \\
+    `p = p0 * (Td(p) / T0)^(Cp/Rd)`; converged points stop being updated
+    Args:
+        p0 (np.ndarray): starting pressure [hPa]
+        T0 (np.ndarray): starting Temp. [K]
+        qv0 (np.ndarray): specific humidity [kg/kg]
+        tol (float): tolerance of the pressure [hPa]
+        max_iter (int): maximum number of iterations
+    Returns:
+        p_lcl (np.ndarray): pressure of the LCL [hPa], not above p0
+        T_lcl (np.ndarray): Temp. of the LCL [K]
+    """
+    p0, T0, qv0 = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (p0, T0, qv0)))
+    p = p0.copy()
+    active = np.ones(p.shape, dtype=bool)
+    for _ in range(max_iter):
+        pa = p[active]
+        Td = anti_cc_equation(qv_2_e(qv0[active], pa))
+        p_new = np.minimum(p0[active] * (Td / T0[active])**(Cp/Rd), p0[active])
+        p[active] = p_new
+        active[active] = np.abs(p_new - pa) > tol
+        if not active.any():
+            break
+    return p, T0 * (p / p0)**(Rd/Cp)
+
+def _dT_dlnp(T, lnp):
+    """**private function**\n
+    moist adiabat: dT/dln(p) = gamma_m * Rd * T / g
+    """
+    qvs = e_2_qv(cc_equation(T), np.exp(lnp))
+    return gamma_m(T, qvs) * Rd * T / g
+
+def moist_lapse(T: np.ndarray, p_from: np.ndarray, p_to: np.ndarray, dlnp: float = 0.02) -> np.ndarray:
+    """Temp. of saturated parcels taken from p_from to p_to along the moist adiabat, \\
+    RK4 in ln(p) with steps of at most `dlnp` (same number of steps for all parcels)
+    Args:
+        T (np.ndarray): Temp. at p_from [K]
+        p_from (np.ndarray): starting pressure [hPa]
+        p_to (np.ndarray): final pressure [hPa]
+        dlnp (float): maximum step in ln(p)
+    Returns:
+        T (np.ndarray): Temp. at p_to [K]
+    """
+    T, lnp, lnp_to = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (T, np.log(p_from), np.log(p_to))))
+    T, lnp = T.copy(), lnp.copy()
+    n = max(int(np.ceil(np.nanmax(np.abs(lnp_to - lnp), initial=0) / dlnp)), 1)
+    dx = (lnp_to - lnp) / n
+    for _ in range(n):
+        k1 = _dT_dlnp(T, lnp)
+        k2 = _dT_dlnp(T + dx/2*k1, lnp + dx/2)
+        k3 = _dT_dlnp(T + dx/2*k2, lnp + dx/2)
+        k4 = _dT_dlnp(T + dx*k3, lnp + dx)
+        T += dx/6 * (k1 + 2*k2 + 2*k3 + k4)
+        lnp += dx
+    return T
+
+def lift_parcel(p: np.ndarray, T0: np.ndarray, qv0: np.ndarray, p0: np.ndarray = None, 
+                dlnp: float = 0.02, table=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """parcel Temp. on every level, dry adiabatic below the LCL and moist adiabatic above\n
+    all columns are lifted together, one level at a time
+    Args:
+        p (np.ndarray): pressure [hPa] of the levels, (nz,) or (nz, ...), decreasing along axis 0
+        T0 (np.ndarray): starting Temp. [K] of each parcel, shape (...)
+        qv0 (np.ndarray): starting specific humidity [kg/kg], shape (...)
+        p0 (np.ndarray, optional): starting pressure [hPa], default is `p[0]`
+        dlnp (float): maximum RK4 step in ln(p) along the moist adiabat
+        table (lookup.PseudoAdiabatTable, optional): look the moist adiabats up instead of integrating, \\
+            parcels outside the table are integrated
+    Returns:
+        T_parcel (np.ndarray): (nz, ...) parcel Temp. [K]
+        p_lcl (np.ndarray): pressure of the LCL [hPa]
+        T_lcl (np.ndarray): Temp. of the LCL [K]
+    Example:
+        ```python
+        # T, qv: (nz, ny, nx), p: (nz,) or (nz, ny, nx)
+        T_parcel, p_lcl, T_lcl = lift_parcel(p, T[0], qv[0])
+        ```
+    """
+    p = np.asarray(p, dtype=float)
+    T0, qv0 = np.asarray(T0, dtype=float), np.asarray(qv0, dtype=float)
+    col_shape = np.broadcast_shapes(T0.shape, qv0.shape, p.shape[1:])
+    p0 = p[0] if p0 is None else np.asarray(p0, dtype=float)
+    p_lcl, T_lcl = lcl(p0, T0, qv0)
+    p_lcl, T_lcl = np.broadcast_to(p_lcl, col_shape), np.broadcast_to(T_lcl, col_shape)
+    T_parcel = np.empty((p.shape[0],) + col_shape)
+    if table is not None:
+        theta_w = table.theta_wet(T_lcl, p_lcl)
+        for k in range(p.shape[0]):
+            pk = np.broadcast_to(p[k], col_shape)
+            moist = pk < p_lcl
+            T_moist = table.temperature(theta_w, pk)
+            if (miss := moist & np.isnan(T_moist)).any():
+                T_moist[miss] = moist_lapse(T_lcl[miss], p_lcl[miss], pk[miss], dlnp)
+            T_parcel[k] = np.where(moist, T_moist, T0 * (pk / p0)**(Rd/Cp))
+        return T_parcel, p_lcl, T_lcl
+    T_cur, p_cur = T_lcl.copy(), p_lcl.copy()
+    for k in range(p.shape[0]):
+        pk = np.broadcast_to(p[k], col_shape)
+        moist = pk < p_lcl
+        if moist.any():
+            T_cur = moist_lapse(T_cur, p_cur, np.where(moist, pk, p_cur), dlnp)
+            p_cur = np.where(moist, pk, p_cur)
+        T_parcel[k] = np.where(moist, T_cur, T0 * (pk / p0)**(Rd/Cp))
+    return T_parcel, p_lcl, T_lcl
+
+def _crossing(lnp, B, k):
+    """**private function**\n
+    ln(p) where B crosses 0 between the levels k and k+1 (linear in ln(p))
+    """
+    take = lambda a, i: np.take_along_axis(a, i[None], axis=0)[0]
+    b0, b1 = take(B, k), take(B, k + 1)
+    l0, l1 = take(lnp, k), take(lnp, k + 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(b0 != b1, b0 / (b0 - b1), 0)
+    return l0 + np.clip(w, 0, 1) * (l1 - l0)
+
+def parcel_profile(p: np.ndarray, T: np.ndarray, qv: np.ndarray, T0: np.ndarray = None, qv0: np.ndarray = None,
+                   p0: np.ndarray = None, dlnp: float = 0.02, table=None) -> dict:
+    """lift parcels through environmental columns: LCL, LFC, EL and the parcel profile\n
+    the buoyancy is the Temp. difference parcel - environment, levels are interpolated linearly in ln(p)
+    Args:
+        p (np.ndarray): pressure [hPa], (nz,) or (nz, ...), decreasing along axis 0
+        T (np.ndarray): environmental Temp. [K], (nz, ...)
+        qv (np.ndarray): environmental specific humidity [kg/kg], (nz, ...)
+        T0, qv0, p0 (np.ndarray, optional): starting parcel, default is the lowest level
+        dlnp (float): maximum RK4 step in ln(p) along the moist adiabat
+        table (lookup.PseudoAdiabatTable, optional): see `lift_parcel`
+    Returns:
+        res (dict): 'T_parcel' (nz, ...), 'p_lcl', 'T_lcl', 'p_lfc', 'p_el' [hPa] of shape (...), \\
+            'p_lfc' and 'p_el' are nan without a free convection level, \\
+            'p_el' is nan if the parcel is still buoyant at the top
+    Example:
+        ```python
+        res = parcel_profile(p, T, qv) # T, qv: (nz, ny, nx)
+        res['p_lfc'], res['p_el']
+        ```
+    """
+    T, qv = np.asarray(T, dtype=float), np.asarray(qv, dtype=float)
+    p = np.broadcast_to(np.asarray(p, dtype=float).reshape((-1,) + (1,) * (T.ndim - 1)) 
+                        if np.ndim(p) == 1 else p, T.shape)
+    T0  = T[0] if T0 is None else T0
+    qv0 = qv[0] if qv0 is None else qv0
+    T_parcel, p_lcl, T_lcl = lift_parcel(p, T0, qv0, p0, dlnp, table)
+    B   = T_parcel - T
+    lnp = np.log(p)
+    nz  = T.shape[0]
+    
+    free = (B > 0) & (p <= p_lcl)               # buoyant above the LCL
+    has_lfc = free.any(axis=0)
+    k_lfc = np.argmax(free, axis=0)             # first free level
+    below = np.maximum(k_lfc - 1, 0)
+    lnp_lfc = np.minimum(_crossing(lnp, B, below), np.log(p_lcl))
+    lnp_lfc = np.where((k_lfc == 0) | (np.take_along_axis(B, below[None], 0)[0] > 0), np.log(p_lcl), lnp_lfc)
+    
+    k_top = nz - 1 - np.argmax(free[::-1], axis=0) # last free level
+    has_el = has_lfc & (k_top < nz - 1)
+    lnp_el = _crossing(lnp, B, np.minimum(k_top, nz - 2))
+    return {
+        'T_parcel': T_parcel, 'p_lcl': p_lcl, 'T_lcl': T_lcl, 
+        'p_lfc': np.where(has_lfc, np.exp(lnp_lfc), np.nan),
+        'p_el' : np.where(has_el, np.exp(lnp_el), np.nan),
+    }
+
+# ==================================================
+
+def main():
+    nz, ny, nx = 60, 100, 100
+    p  = np.linspace(1000, 100, nz)
+    rng = np.random.default_rng(0)
+    T0 = 300 + rng.normal(0, 2, (ny, nx))
+    T  = T0 - 6.5e-3 * (-Rd * 250 / g * np.log(p / 1000))[:, None, None] 
+    T  = np.maximum(T, 210)
+    qv = 0.016 * (p / 1000)[:, None, None]**3 * np.ones((ny, nx))
+    t0 = perf_counter()
+    res = parcel_profile(p, T, qv)
+    print(f'{ny*nx} columns: {(perf_counter() - t0)*1000:.1f} ms')
+    print({k: float(np.nanmean(v)) for k, v in res.items() if k != 'T_parcel'})
+
+# ==================================================
+from time import perf_counter
+if __name__ == '__main__':
+    start_time = perf_counter()
+    main()
+    end_time = perf_counter()
+    print('\ntime :%.3f ms' %((end_time - start_time)*1000))
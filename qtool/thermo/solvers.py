@@ -0,0 +1,171 @@
+# Iterative thermodynamic solvers on whole arrays: wet-bulb Temp., saturation adjustment, dew point
+# ==================================================
+import numpy as np
+
+from .thermo import Cp, Lv, Rv, cc_equation, anti_cc_equation, e_2_qv, qv_2_e
+# ==================================================
+__all__ = ['newton_solve', 'dewpoint', 'wet_bulb', 'saturation_adjustment']
+# ==================================================
+# pressure [hPa], Temp. [K], specific humidity [kg/kg]
+
+def newton_solve(fun, x0: np.ndarray, tol: float = 1e-6, max_iter: int = 20, 
+                 method: str = 'newton') -> tuple[np.ndarray, dict]:
+    """elementwise root of f by Newton or Halley iterations with per-point convergence masks\n
+    only the unconverged points are evaluated and updated at each iteration
+    Args:
+        fun (Callable): fun(x, idx) -> (f, df) for 'newton', (f, df, d2f) for 'halley', \\
+            x holds the active points and idx their flat indices (to take the matching parameters)
+        x0 (np.ndarray): initial guess
+        tol (float): stop a point when |step| <= tol
+        max_iter (int): maximum number of iterations
+        method (str): 'newton' (2nd order) or 'halley' (3rd order)
+    Returns:
+        x (np.ndarray): roots, shape of x0
+        stats (dict): 'n_iter' (iterations), 'n_eval' (point evaluations of fun), \\
+            'converged' (bool array), 'max_step' (last |step| of the unconverged points, 0 if all converged)
+    Example:
+        ```python
+        c = np.array([2., 3., 10.])
+        x, stats = newton_solve(lambda x, idx: (x**2 - c[idx], 2*x), np.ones(3)) # sqrt(c)
+        ```
+    """
+    if method not in ('newton', 'halley'):
+        raise ValueError(f"method must be 'newton' or 'halley', got '{method}'")
+    x = np.array(x0, dtype=float)
+    shape = x.shape
+    x = x.ravel()
+    idx = np.arange(x.size)
+    step = np.zeros(0)
+    failed = ~np.isfinite(x)
+    idx = idx[~failed]
+    stats = {'n_iter': 0, 'n_eval': 0}
+    for _ in range(max_iter):
+        if idx.size == 0:
+            break
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            res = fun(x[idx], idx)
+            if method == 'newton':
+                step = res[0] / res[1]
+            else:
+                f, df, d2f = res
+                step = 2*f*df / (2*df**2 - f*d2f)
+        finite = np.isfinite(step)
+        x[idx[finite]] -= step[finite]
+        stats['n_iter'] += 1
+        stats['n_eval'] += idx.size
+        failed[idx[~finite]] = True # diverged / NaN: stop iterating, keep the last x, not converged
+        keep = finite & (np.abs(step) > tol)
+        idx, step = idx[keep], step[keep]
+    converged = ~failed
+    converged[idx] = False
+    stats['converged'] = converged.reshape(shape)
+    stats['max_step'] = float(np.abs(step).max()) if step.size else 0.
+    return x.reshape(shape), stats
+
+def dewpoint(qv: np.ndarray, P: np.ndarray) -> np.ndarray:
+    """dew point [K]: the cc equation of this module inverts in closed form, no iteration needed"""
+    return anti_cc_equation(qv_2_e(qv, P))
+
+def _isobaric(T, qv, P):
+    """**private function**\n
+    residual of isobaric evaporation / condensation, `Cp*(x - T) + Lv*(qvs(x, P) - qv)`, and its derivatives
+    """
+    def fun(x, idx):
+        T_i, qv_i, P_i = T[idx], qv[idx], P[idx]
+        qvs = e_2_qv(cc_equation(x), P_i)
+        a   = Lv / (Rv * x**2)                   # d ln(es) / dT
+        f   = Cp * (x - T_i) + Lv * (qvs - qv_i)
+        df  = Cp + Lv * qvs * a
+        d2f = Lv * qvs * (a**2 - 2*a/x)
+        return f, df, d2f
+    return fun
+
+def _flat(*arrs):
+    """**private function**"""
+    arrs = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in arrs))
+    return arrs[0].shape, [a.ravel() for a in arrs]
+
+def wet_bulb(T: np.ndarray, qv: np.ndarray, P: np.ndarray, tol: float = 1e-6, max_iter: int = 20,
+             method: str = 'halley') -> tuple[np.ndarray, dict]:
+    """isobaric wet-bulb Temp. [K]: `Cp*(T - Tw) = Lv*(qvs(Tw, P) - qv)`\n
+    the residual is increasing and convex in Tw, the iterations start from T: \
+    they decrease monotonically for subsaturated points, supersaturated points start left of the root \
+    (the first step overshoots it, then the iterations decrease monotonically)
+    Args:
+        T (np.ndarray): Temp. [K]
+        qv (np.ndarray): specific humidity [kg/kg]
+        P (np.ndarray): pressure [hPa]
+        tol (float): tolerance [K]
+        max_iter (int): maximum number of iterations
+        method (str): 'halley' or 'newton', see `newton_solve`
+    Returns:
+        Tw (np.ndarray): wet-bulb Temp. [K]
+        stats (dict): see `newton_solve`
+    Example:
+        ```python
+        Tw, stats = wet_bulb(T, qv, P) # (nz, ny, nx) fields, stats['n_iter'] ~ 3
+        ```
+    """
+    shape, (T, qv, P) = _flat(T, qv, P)
+    Tw, stats = newton_solve(_isobaric(T, qv, P), T, tol, max_iter, method)
+    stats['converged'] = stats['converged'].reshape(shape)
+    return Tw.reshape(shape), stats
+
+def saturation_adjustment(T: np.ndarray, qv: np.ndarray, qc: np.ndarray, P: np.ndarray, tol: float = 1e-6,
+                          max_iter: int = 20, method: str = 'halley') -> tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+    """isobaric saturation adjustment: condense supersaturation and evaporate cloud water into subsaturated air\n
+    conserves `Cp*T + Lv*qv` and `qv + qc`; supersaturated or cloudy points are solved to saturation, \\
+    cloudy points without enough cloud water to saturate evaporate it all
+    Args:
+        T (np.ndarray): Temp. [K]
+        qv (np.ndarray): specific humidity [kg/kg]
+        qc (np.ndarray): cloud water [kg/kg]
+        P (np.ndarray): pressure [hPa]
+        tol, max_iter, method: see `wet_bulb`
+    Returns:
+        T, qv, qc (np.ndarray): adjusted fields
+        stats (dict): see `newton_solve`, 'n_solved' is the number of points that needed iterations
+    """
+    shape, (T, qv, qc, P) = _flat(T, qv, qc, P)
+    T, qv, qc = T.copy(), qv.copy(), qc.copy()
+    solve = (qv > e_2_qv(cc_equation(T), P)) | (qc > 0)
+    idx = np.flatnonzero(solve)
+    Ts, stats = newton_solve(_isobaric(T[idx], qv[idx], P[idx]), T[idx], tol, max_iter, method)
+    qvs = e_2_qv(cc_equation(Ts), P[idx])
+    qc_new = qc[idx] + qv[idx] - qvs
+    dry = qc_new < 0 # not enough cloud water to saturate
+    total = qv[idx] + qc[idx]
+    T[idx]  = np.where(dry, T[idx] - Lv / Cp * qc[idx], Ts)
+    qv[idx] = np.where(dry, total, qvs)
+    qc[idx] = np.where(dry, 0., qc_new)
+    converged = np.isfinite(T) & np.isfinite(qv) & np.isfinite(qc) & np.isfinite(P)
+    converged[idx] &= stats['converged']
+    stats['converged'] = converged.reshape(shape)
+    stats['n_solved'] = idx.size
+    return T.reshape(shape), qv.reshape(shape), qc.reshape(shape), stats
+
+# ==================================================
+
+def main():
+    rng = np.random.default_rng(0)
+    n   = 10**6
+    P   = rng.uniform(200, 1000, n)
+    T   = rng.uniform(230, 310, n)
+    qv  = e_2_qv(cc_equation(T), P) * rng.uniform(0.05, 1.2, n)
+    for method in ('newton', 'halley'):
+        t0 = perf_counter()
+        Tw, stats = wet_bulb(T, qv, P, method=method)
+        print(f'wet_bulb ({method}): {(perf_counter() - t0)*1000:.0f} ms / 1e6 points, '
+              f"n_iter {stats['n_iter']}, n_eval/point {stats['n_eval']/n:.2f}, all converged {stats['converged'].all()}")
+    t0 = perf_counter()
+    T2, qv2, qc2, stats = saturation_adjustment(T, qv, np.zeros(n), P)
+    print(f"saturation_adjustment: {(perf_counter() - t0)*1000:.0f} ms, {stats['n_solved']} points solved, "
+          f"n_iter {stats['n_iter']}, energy error {np.abs(Cp*(T2 - T) + Lv*(qv2 - qv)).max():.2e} J/kg")
+
+# ==================================================
+from time import perf_counter
+if __name__ == '__main__':
+    start_time = perf_counter()
+    main()
+    end_time = perf_counter()
+    print('\ntime :%.3f ms' %((end_time - start_time)*1000))
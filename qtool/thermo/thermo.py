@@ -9,6 +9,8 @@ Lv = 2.5e6 # J/kg
 Rv = 461.  # J/kg/K
 g  = 9.81  # m/s^2
 Gamma_d = g / Cp # K/m
+T0  = 273.15 # K, reference point of the cc equation
+es0 = 6.112  # hPa, saturated vapor pressure at T0
     
 def th_2_T(th, P):
     """potential Temp. [K] => Temp. [K]"""
@@ -34,12 +36,19 @@ def theta_e_ac(th, Tc, qv):
     
 # cc equation
 # Temp. [K] <=> saturated vapor pressure [hPa]
-def cc_equation(Temp):
-    es = 6.112 * exp(Lv/Rv * (1/273 - 1/Temp)) # hPa
+# both use T0 = 273.15 K (cc_equation used 273 K before, its es are ~1.1% lower than then)
+# `table` (lookup.SatVaporTable, opt-in, off by default) replaces exp / log by table interpolation, \
+# it is not faster than NumPy's vectorized exp / log (see its docstring)
+def cc_equation(Temp, table=None):
+    if table is not None:
+        return table.es(Temp)
+    es = es0 * exp(Lv/(Rv*T0) - (Lv/Rv) / Temp) # hPa, constants folded
     return es
 
-def anti_cc_equation(es):
-    Temp = 1 / ((1/273.15) - (Rv/Lv) * log(es/6.112))
+def anti_cc_equation(es, table=None):
+    if table is not None:
+        return table.T(es)
+    Temp = 1 / ((1/T0 + (Rv/Lv) * log(es0)) - (Rv/Lv) * log(es))
     return Temp
     
 # specific humidity [kg/kg] <=> vapor pressure [hPa]